@@ -32,6 +32,7 @@ class BallsNotebookRender:
         self.map_size = map_size
         self.team_size = team_size
         self.global_running_r = []
+        self._style_cache = {}
 
         _x_min, _y_min, _x_max, _y_max = 0, 0, map_size, map_size
         plt_loc = figure(
@@ -90,6 +91,18 @@ class BallsNotebookRender:
             # toolbar_location=None
         )
 
+    def _get_ball_styles(self, police_num, thief_num, current_is_caught):
+        """(radius, fill_color, line_width) of all balls, only built once for each team size"""
+        _key = (police_num, thief_num, current_is_caught)
+        if _key not in self._style_cache:
+            thief_color = "red" if current_is_caught else "yellow"
+            thief_lw = 3 if current_is_caught else 1
+            self._style_cache[_key] = (
+                [POLICE_RADIUS * self.map_size] * police_num + [THIEF_RADIUS * self.map_size] * thief_num,
+                ["green"] * police_num + [thief_color] * thief_num,
+                [10] * police_num + [thief_lw] * thief_num)
+        return self._style_cache[_key]
+
     def update_plots(self, env_state_action):
         """update bokeh plots according to new env state and action data"""
         self.draw_new_plot(env_state_action)
@@ -97,30 +110,25 @@ class BallsNotebookRender:
 
     def draw_new_plot(self, env_state_action):
         global_ob, rewards, ep_count, current_step, cur_action, current_is_caught, current_done = env_state_action
-        self.police_num = len(global_ob['police'])
-        self.thief_num = len(global_ob['thief'])
+        # cords may be a list of tuple or an (n, 2) array(e.g. read from an entity pool)
+        police_cords = np.asarray(global_ob['police'], dtype=float).reshape(-1, 2)
+        thief_cords = np.asarray(global_ob['thief'], dtype=float).reshape(-1, 2)
+        self.police_num, self.thief_num = len(police_cords), len(thief_cords)
 
         self.plt_loc.title.text = "step: #{} action: {}".format(current_step,  np.around(cur_action, decimals=1))
 
         # note： if update frequency too high， jupyter notebook will crash exausted
-        agents_x = [_loc[0] for _loc in global_ob['police']]
-        agents_y = [_loc[1] for _loc in global_ob['police']]
-        all_x = agents_x + [_loc[0] for _loc in global_ob['thief']]
-        all_y = agents_y + [_loc[1] for _loc in global_ob['thief']]
-        self.rd_loc.data_source.data['x'] = all_x
-        self.rd_loc.data_source.data['y'] = all_y
-        self.rd_loc.data_source.data['radius'] = [POLICE_RADIUS * self.map_size] * self.police_num + \
-                                                 [THIEF_RADIUS * self.map_size] * self.thief_num
-        self.rd_agent_text.data_source.data['x'] = agents_x
-        self.rd_agent_text.data_source.data['y'] = agents_y
+        all_cords = np.concatenate([police_cords, thief_cords])
+        self.rd_loc.data_source.data['x'] = all_cords[:, 0]
+        self.rd_loc.data_source.data['y'] = all_cords[:, 1]
+        self.rd_agent_text.data_source.data['x'] = police_cords[:, 0]
+        self.rd_agent_text.data_source.data['y'] = police_cords[:, 1]
 
         # blink when game end
-        thief_color = "red" if current_is_caught else "yellow"
-        self.rd_loc.data_source.data['fill_color'] = ["green"] * self.police_num + [
-                                                                                       thief_color] * self.thief_num
-        thief_lw = 3 if current_is_caught else 1
-        self.rd_loc.data_source.data['line_width'] = [10] * self.police_num + [
-                                                                                  thief_lw] * self.thief_num
+        radius, fill_color, line_width = self._get_ball_styles(self.police_num, self.thief_num, current_is_caught)
+        self.rd_loc.data_source.data['radius'] = radius
+        self.rd_loc.data_source.data['fill_color'] = fill_color
+        self.rd_loc.data_source.data['line_width'] = line_width
 
         if current_done:
             ep_reward = sum(rewards)
@@ -2,7 +2,6 @@ from collections import defaultdict
 import gym
 import gym.spaces
 import numpy as np
-import random
 
 from .police_kill_one import PoliceKillOneEnv
 from gym_sandbox.envs.plot import balls_game_dashboard
@@ -17,60 +16,113 @@ class PoliceMADDPGEnv(PoliceKillOneEnv):
     DDPG: require env accept a continous action
     MA: step() accept multi action, and return multi result
     KillOne: when any thief is caught, game end!  So this env is suitable for state of fixed postion list
+    state_format:
+        cord_list_unfixed: every agent sees every entity, size grows as N*(N+M)
+        cord_list_knn: every agent only sees its k nearest police and k nearest thieves, for large swarms
     """
-    def __init__(self, **kwargs):
+    def __init__(self, knn_k=4, dist_kernel='l2', **kwargs):
         # assert kwargs["agent_num"] > 1  # come on, this is MA!
-        assert kwargs["state_format"] == "cord_list_unfixed"  # lower complexity, only fixed cord
-        super().__init__(**kwargs)
+        # lower complexity, only fixed cord
+        assert kwargs["state_format"] in ("cord_list_unfixed", "cord_list_knn")
+        # as action is a continous angle with any direction, now dist should be radius based
+        super().__init__(dist_kernel=dist_kernel, **kwargs)
 
-    def calc_dist(self, pos1, pos2):
-        """as action is a continous angle with any direction, now dist should be radius based"""
-        _coords1 = np.array(pos1)
-        _coords2 = np.array(pos2)
+        self.knn_k = knn_k
+        if self.state_format == "cord_list_knn":
+            # for each agent: k police cords + k thief cords + k police mask + k thief mask
+            self.observation_space = gym.spaces.Box(float(-1), float(1), (knn_k * 6,))
 
-        # calc Euclidean Distance
-        # alternative way: np.linalg.norm(_coords1 - _coords2)
-        eucl_dist = np.sqrt(np.sum((_coords1 - _coords2) ** 2))
-        return eucl_dist
+        # reusable buffers of pairwise relative cords, shared by catch detection and ob
+        self._abs_cords = None
+        self._rel_cords = None
+        self._rel_cords_state = None  # the state that _rel_cords is computed from
+        self._cmp_dist = None  # (N, N+M) dist from each police to every entity, in cmp unit, with _rel_cords
+        self.police_thief_cmp_dist = None  # (N, M) dist matrix of last catch detection, in cmp unit
+
+    def _update_relative_cords(self, state):
+        """cords of all entities relative to each police, shape (N, N+M, 2), and their dist(see _cmp_dist)
+        Computed by one broadcast into a reusable buffer, and only once per state:
+        catch detection computes it, then ob of the same state reuses it.
+        """
+        if state is self._rel_cords_state:
+            return self._rel_cords
+
+        police_num, thief_num = len(state["police"]), len(state["thief"])
+        total_num = police_num + thief_num
+        if self._rel_cords is None or self._rel_cords.shape[:2] != (police_num, total_num):
+            self._abs_cords = np.empty((total_num, 2))
+            self._rel_cords = np.empty((police_num, total_num, 2))
 
-    def _trans_state(self, state):
-        # now only support cord_list_unfixed, so must be KillOne mode!
         # Firstly absolute cord
-        abs_ob = [_p for _p in state["police"]] + [_t for _t in state["thief"]]
-        abs_ob = np.array(abs_ob)
+        self._abs_cords[:police_num] = state["police"]
+        if thief_num:
+            self._abs_cords[police_num:] = state["thief"]
 
         # now relative cord (make self position as (0,0))
-        # abs_state = [abs_ob.copy() for _ in range(self.agent_num)]
-        relative_state = [abs_ob.copy() - np.array(_p) for _p in state["police"]]
-        relative_state = [_.ravel() / self.map_size for _ in relative_state]
+        np.subtract(self._abs_cords[None, :, :], self._abs_cords[:police_num, None, :], out=self._rel_cords)
+        if self.dist_kernel.supports_norm:
+            self._cmp_dist = self.dist_kernel.cmp_norm(self._rel_cords)
+        else:
+            # e.g. walking dist on a game map isn't a function of relative cords, look up both ends
+            self._cmp_dist = self.dist_kernel.pairwise_cmp(self._abs_cords[:police_num], self._abs_cords)
+        self._rel_cords_state = state
+        return self._rel_cords
+
+    def _trans_state(self, state):
+        # now only support cord list, so must be KillOne mode!
+        relative_state = self._update_relative_cords(state)
+        if self.state_format == "cord_list_knn":
+            return self._knn_state(relative_state)
+
+        # ob is a new array, so that it's safe to be kept by algo(e.g. replay buffer)
+        return relative_state.reshape(len(relative_state), -1) / self.map_size
+
+    def _knn_state(self, relative_state):
+        """egocentric ob of k nearest police(except myself) and k nearest thieves
+        each row: [k police cords, k thief cords, k police mask, k thief mask], nearest first
+        mask is 0 for padding when there're less than k entities
+        """
+        police_num = len(relative_state)
+        cmp_dist = self._cmp_dist.astype(float)  # cmp unit is enough to sort
+        police_cords, police_mask = _k_nearest(
+            relative_state[:, :police_num], cmp_dist[:, :police_num], self.knn_k, exclude_self=True)
+        thief_cords, thief_mask = _k_nearest(relative_state[:, police_num:], cmp_dist[:, police_num:], self.knn_k)
+
+        return np.concatenate([
+            police_cords.reshape(police_num, -1) / self.map_size,
+            thief_cords.reshape(police_num, -1) / self.map_size,
+            police_mask, thief_mask], axis=1)
 
-        return np.array(relative_state)
+    def check_thief_caught(self, cur_state):
+        # same as KillOne, but dist is taken from the shared relative cords
+        self._update_relative_cords(cur_state)
+        self.police_thief_cmp_dist = self._cmp_dist[:, len(cur_state["police"]):]
+
+        kill_num = int(np.any(self.police_thief_cmp_dist <= self.dist_kernel.cmp_radius(self.min_catch_dist)))
+        return cur_state, kill_num
 
     # here MADDPG defaultly require a list of reward,
     # so that it allows an different reward for different agent
-    # but for simplicity here we return a single same reward for all agent
+    # sparse: a single same reward for all agent, dense: plus each agent's own dist shaping
     def _cal_reward(self, kill_num, is_done):
+        reward = self._cal_sparse_reward(kill_num)
+        rewards = np.full((self.agent_num, 1), float(reward))
 
-        reward = super()._cal_reward(kill_num, is_done)
-        rewards = np.array([[reward] for _ in range(self.agent_num)]).astype(np.float)
-
-        # if not is_done:
-        #
-        #     # if not done, add up dist reward to help boost
-        #     thief_list = self.current_state['thief']
-        #     police_list = self.current_state['police']
-        #
-        #     max_dist = self.map_size * np.sqrt(2) * len(thief_list)  # for normalize
-        #
-        #     for _i in range(self.agent_num):
-        #         _p = police_list[_i]
-        #         _all_dist = sum([self.calc_dist(_p, _t) for _t in thief_list])
-        #         _dist_reward = 0.9 - _all_dist/max_dist
-        #
-        #         rewards[_i] += _dist_reward
+        if self._use_dense_reward(is_done):
+            dense_rewards = self._cal_dense_rewards()
+            rewards += dense_rewards[:, None]
+            reward += float(np.mean(dense_rewards))  # team reward for statistic
 
+        self.reward_hist.append(reward)
         return rewards
 
+    def _cal_dense_rewards(self):
+        """shaping of each police by sum of dist to all thieves, from dist matrix of catch detection"""
+        # for normalize, walking dist on game map is clipped as UNREACHABLE is far larger
+        max_dist = self.map_size * np.sqrt(2) if self.game_map is None else self.game_map.max_nav_dist
+        police_thief_dist = np.minimum(self.dist_kernel.cmp_to_dist(self.police_thief_cmp_dist), max_dist)
+        return 0.9 - np.sum(police_thief_dist, axis=1) / (max_dist * len(self.current_state['thief']))
+
     def _get_avail_new_loc(self, my_pos, my_speed):
         """as it get easier for multiagent to catch, we need to make thief stronger"""
         # stop or eight direction, it's A33 of [0,1,-1]
@@ -79,9 +131,36 @@ class PoliceMADDPGEnv(PoliceKillOneEnv):
         ]) * my_speed  + np.array(my_pos)
 
         new_loc = [self.ensure_inside(_l) for _l in new_loc]
+        if self.game_map is not None:
+            new_loc = [_l for _l in new_loc if self.game_map.can_move(my_pos, _l)] or [my_pos]
         return new_loc
 
     # make thief smarter, keep away only from the nearest one
-    def get_position_rating(self, my_new_pos, adversary_list):
-        all_dist = [self.calc_dist(my_new_pos, _ad) for _ad in adversary_list]
-        return min(all_dist)
\ No newline at end of file
+    def get_position_ratings(self, my_new_pos_list, adversary_list):
+        return np.min(self.dist_kernel.pairwise(my_new_pos_list, adversary_list), axis=1)
+
+
+def _k_nearest(relative_cords, cmp_dist, k, exclude_self=False):
+    """pick k nearest entities of each agent by a batched partial sort
+    relative_cords: (N, E, 2), cords of E entities relative to each agent
+    cmp_dist: (N, E) float dist of them(any monotonic unit), it's changed in place when exclude_self
+    return ((N, k, 2) cords sorted by dist, (N, k) mask), padding is 0 in both
+    """
+    agent_num, entity_num = relative_cords.shape[:2]
+    if exclude_self:
+        cmp_dist[np.arange(agent_num), np.arange(agent_num)] = np.inf
+
+    kk = min(k, entity_num)
+    if kk < entity_num:
+        nearest = np.argpartition(cmp_dist, kk - 1, axis=1)[:, :kk]
+    else:
+        nearest = np.broadcast_to(np.arange(entity_num), (agent_num, entity_num))
+    # only sort the k picked ones
+    order = np.argsort(np.take_along_axis(cmp_dist, nearest, axis=1), axis=1)
+    nearest = np.take_along_axis(nearest, order, axis=1)
+
+    cords = np.zeros((agent_num, k, 2))
+    mask = np.zeros((agent_num, k))
+    mask[:, :kk] = np.isfinite(np.take_along_axis(cmp_dist, nearest, axis=1))
+    cords[:, :kk] = np.take_along_axis(relative_cords, nearest[:, :, None], axis=1) * mask[:, :kk, None]
+    return cords, mask
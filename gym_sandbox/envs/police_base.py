@@ -2,10 +2,17 @@ from collections import defaultdict
 import gym
 import gym.spaces
 import numpy as np
-import random
 
 from gym_sandbox.envs.plot.balls_game_dashboard import BallsNotebookRender
 from gym_sandbox.envs.plot.balls_bokeh_serve import BallsBokehServeRender
+from gym_sandbox.envs.utils.lazy_ob import LazyObservation
+from gym_sandbox.envs.utils.spawn import SpawnSampler, cords_to_list
+from gym_sandbox.envs.utils.seeding import np_random
+from gym_sandbox.envs.utils.int_engine import IntGridEngine
+from gym_sandbox.envs.utils.grid_pyramid import GridPyramid, window_view
+from gym_sandbox.envs.utils.dist_field import StaticDistanceField
+from gym_sandbox.envs.utils.dist_kernel import get_dist_kernel
+from gym_sandbox.envs.utils.game_map import GameMap
 
 MOVE_ACTIONS = [[0, -1], [0, 1], [-1, 0], [1, 0]]  # up/down/left/right
 GRID_CHANNELS = {
@@ -32,12 +39,24 @@ class PoliceKillAllEnv(gym.Env):
                  adversary_action="static", state_format='grid3d',
                  police_speed=2, thief_speed=1,
                  grid_scale=2, min_catch_dist=3,
-                 action_type='discret'):
+                 action_type='discret', frame_skip=1, lazy_ob=False, use_int_engine=True,
+                 local_window=11, pyramid_factors=(2, 4, 8), reward_mode='sparse', dist_kernel='l1',
+                 game_map=None):
         """the init params should be passed in by code of env registering
         agent_team: police/thief
-        state_format: grid3d/grid3d_ravel/cord_list_unfixed/cord_list_fixed_500
+        state_format: grid3d/grid3d_ravel/grid3d_local/grid3d_pyramid/cord_list_unfixed/cord_list_fixed_500
         adversary_action: static/simple/random
         action_type: discret/continous_angle/continous_vector
+        frame_skip: repeat each action for k ticks, ob is only built after the last tick
+        lazy_ob: return a LazyObservation handle, the real ob is built only when converted to array(not for grid3d_pyramid)
+        use_int_engine: use the integer fast path when the game logic allows(see _can_use_int_engine)
+        local_window: (odd) grid num of each side of the window centered on each police, for grid3d_local
+        pyramid_factors: pooling factors of the global grids of grid3d_pyramid
+        reward_mode: sparse/dense, dense adds a dist based shaping, taken from dist of catch detection
+        dist_kernel: l1/l2/chebyshev, dist used by catch, thief AI and reward
+        game_map: None/map name in utils.game_map.MAPS/a GameMap, walls block every move,
+                  and dist becomes walking dist on the map(lookups of its nav field), dist_kernel is ignored,
+                  only for action_type='discret'(also in the MADDPG env)
         Note: for simplicity, the map is a square
         """
         self.teams = {
@@ -46,6 +65,15 @@ class PoliceKillAllEnv(gym.Env):
         }
         self.grid_scale=grid_scale
         self.min_catch_dist=min_catch_dist
+        self.dist_kernel = get_dist_kernel(dist_kernel)
+        self.game_map = None
+        if game_map is not None:
+            if action_type != 'discret':
+                # walls and the navigation field are on int cells, continuous moves would need snapping
+                raise ValueError("game_map only supports action_type='discret', got %r" % action_type)
+            self.game_map = game_map if isinstance(game_map, GameMap) else GameMap.from_name(game_map, map_size)
+            assert self.game_map.map_size == map_size
+            self.dist_kernel = self.game_map.geodesic_kernel
         self.game_dashboard = None
 
         self.map_size = map_size
@@ -59,6 +87,13 @@ class PoliceKillAllEnv(gym.Env):
         }
         self.adversary_action = adversary_action
         self.action_type = action_type
+        assert frame_skip >= 1
+        self.frame_skip = frame_skip
+        assert reward_mode in ("sparse", "dense")
+        self.reward_mode = reward_mode
+        self.police_nearest_dist = None  # dist from each police to nearest thief, by catch detection
+        # grid3d_pyramid ob is a tuple and its grids are updated incrementally step by step, never lazy
+        self.lazy_ob = lazy_ob and state_format != 'grid3d_pyramid'
 
         # police thief location
         _map_center = int(self.map_size / 2)
@@ -66,9 +101,35 @@ class PoliceKillAllEnv(gym.Env):
         self._police_range = _map_center - _police_radius, _map_center + _police_radius
         _thief_radius = int(self.map_size * 0.4)
         self._thief_range = _map_center - _thief_radius, _map_center + _thief_radius
+        self.spawn_sampler = SpawnSampler(self.map_size, self._police_range, self._thief_range,
+                                          walls=self.game_map.walls if self.game_map is not None else None)
+
+        # every env owns its rng, all randomness of the game(spawn, thief AI, etc.) comes from it
+        self.np_random = None
+        self.seed_seq = None
+        self.reset_rng_state = None
+        self._seed()
 
         self.state_format = state_format
 
+        # grid3d_local: windows are strided views of one padded world grid, only copied when batching
+        assert local_window % 2 == 1  # so that police is at the center
+        self.local_window = local_window
+        self._padded_grid = None
+        self._local_windows = None
+
+        # grid3d_pyramid: local crop + sum pooled global grids, all updated incrementally
+        self.pyramid_factors = pyramid_factors
+        self.grid_pyramid = None
+        self._channel_scale = np.ones(GRID_DEPTH)
+        self._channel_scale[GRID_CHANNELS["thief"]["num"]] = 1 / adversary_num  # same as build_grid
+
+        # integer fast path, gives exactly the same trajectory as the python logic
+        self.int_engine = IntGridEngine(map_size, police_speed, thief_speed) \
+            if use_int_engine and self._can_use_int_engine() else None
+        # static thieves: dist to nearest thief is precomputed over the map at reset
+        self.static_field = None
+
         # performance wrapper
         self.episode_count = 0
         self.last_state = None
@@ -95,6 +156,17 @@ class PoliceKillAllEnv(gym.Env):
         elif state_format == 'grid3d_ravel':
             self.observation_space = gym.spaces.Box(
                 float(0), float(1), self._get_zero_grid().ravel().shape)
+        elif state_format == 'grid3d_local':
+            _local_shape = (local_window, local_window, GRID_DEPTH)
+            self.observation_space = gym.spaces.Box(
+                float(0), float(1), _local_shape if agent_num == 1 else (agent_num,) + _local_shape)
+        elif state_format == 'grid3d_pyramid':
+            _local_shape = (local_window, local_window, GRID_DEPTH)
+            _grid_num = map_size * grid_scale
+            self.observation_space = gym.spaces.Tuple(
+                [gym.spaces.Box(float(0), float(1), _local_shape if agent_num == 1 else (agent_num,) + _local_shape)] +
+                [gym.spaces.Box(float(0), float(_f ** 2), (-(-_grid_num // _f), -(-_grid_num // _f), GRID_DEPTH))
+                 for _f in pyramid_factors])
         elif state_format == 'cord_list_fixed_500':
             self.observation_space = gym.spaces.Box(
                 float(0), float(1), (500*2,))
@@ -107,6 +179,22 @@ class PoliceKillAllEnv(gym.Env):
         # for statistic usage
         self.total_reward_last_10 = []
 
+    def _can_use_int_engine(self):
+        """int engine only reproduces the default logic: discret move, int speed, Manhattan dist
+        so any subclass overriding these game rules falls back to the python logic
+        """
+        cls = type(self)
+        default_rules = ('ensure_inside', '_get_avail_new_loc', 'get_position_ratings',
+                         '_take_simple_action', '_take_random_action', '_police_move_by_discret')
+        return self.action_type == 'discret' and self.dist_kernel.name == 'l1' \
+            and all(isinstance(_v, int) for _v in (self.map_size, self.teams['police']['speed'],
+                                                  self.teams['thief']['speed'])) \
+            and all(getattr(cls, _f) is getattr(PoliceKillAllEnv, _f) for _f in default_rules)
+
+    def _can_use_static_field(self):
+        """thieves never move(and none is added midway), and cords are int, so dist can be a table"""
+        return self.adversary_action == "static" and self.int_engine is not None
+
     def init_params(self, show_dashboard=True, bokeh_output="notebook"):
         """to control something after env is made
         bokeh_output:  notebook/standalone"""
@@ -133,16 +221,65 @@ class PoliceKillAllEnv(gym.Env):
         elif self.state_format in ('grid3d', 'grid3d_ravel'):
             channel_grids = self.build_grid(state)
             return channel_grids.ravel() if self.state_format == "grid3d_ravel" else channel_grids
+        elif self.state_format == 'grid3d_local':
+            local_grids = self.build_local_grids(state)
+            return local_grids[0] if self.agent_num == 1 else local_grids
+        elif self.state_format == 'grid3d_pyramid':
+            return self.build_grid_pyramid(state)
+
+    def _seed(self, seed=None):
+        """seed: None/int/SeedSequence, seed vector envs or workers by SeedSequence.spawn of one root seed"""
+        self.np_random, self.seed_seq = np_random(seed)
+        self.spawn_sampler.rng = self.np_random
+        return [self.seed_seq.entropy] + list(self.seed_seq.spawn_key)  # spawn_key tells the child envs apart
+
+    def _get_ob(self):
+        """ob of current state, a lazy handle if lazy_ob is on"""
+        if self.lazy_ob:
+            return LazyObservation(self._trans_state, self.current_state)
+        return self._trans_state(self.current_state)
 
     def _cal_reward(self, kill_num, is_done):
+        """in dense mode, the team reward adds average shaping of all police"""
+        reward = self._cal_sparse_reward(kill_num)
+        if self._use_dense_reward(is_done):
+            reward += float(np.mean(self._cal_dense_rewards()))
+        self.reward_hist.append(reward)
+        return reward
+
+    def _cal_sparse_reward(self, kill_num):
         """
         w.r.t idea of MountainCar
         if no thief caught, always -1
         so that total reward will represent how fast the agent can finish all
         """
-        reward = kill_num or -1
-        self.reward_hist.append(reward)
-        return reward
+        return kill_num or -1
+
+    def _use_dense_reward(self, is_done):
+        # if not done, add up dist reward to help boost
+        return self.reward_mode == "dense" and not is_done
+
+    def _cal_dense_rewards(self):
+        """shaping of each police, the closer to the nearest thief the better"""
+        if not len(self.current_state['thief']):
+            return np.zeros(len(self.current_state['police']))  # e.g. waiting for new thief of RandomBallsEnv
+        max_dist = self._max_dist()
+        return 0.9 - np.minimum(self._get_police_nearest_dist(), max_dist) / max_dist
+
+    def _max_dist(self):
+        """for normalize: max manhattan dist(the largest of all cord kernels), or the longest walk on the game map
+        (police can't reach a thief behind walls, its UNREACHABLE dist is clipped to this)
+        """
+        return 2 * self.map_size if self.game_map is None else self.game_map.max_nav_dist
+
+    def _get_police_nearest_dist(self):
+        """reuse dist of catch detection of this tick, only calc when catch detection didn't run
+        (e.g. trigger is not pulled)
+        """
+        if self.police_nearest_dist is None:
+            self.police_nearest_dist = self.dist_kernel.pairwise(
+                self.current_state['thief'], self.current_state['police']).min(axis=0)
+        return self.police_nearest_dist
 
     def _cal_done(self, state, kill_num):
         all_killed = len(state["thief"]) == 0
@@ -152,30 +289,30 @@ class PoliceKillAllEnv(gym.Env):
 
         return False
 
-    def add_one_thief(self):
-        thief_loc = (
-            random.choice([random.randint(0, self._thief_range[0]),
-                           random.randint(self._thief_range[1], self.map_size)]),
-            random.choice([random.randint(0, self._thief_range[0]),
-                           random.randint(self._thief_range[1], self.map_size)]))
-        return thief_loc
+    def _get_init_state(self):
+        """draw spawn points of all police and thief in one batched call"""
+        # police go from map center, so that it must go toward a random direction to catch thief
+        # make thief away from center
+        police_cords, thief_cords = self.spawn_sampler.sample(self.team_size["police"], self.team_size["thief"])
+        return {
+            "police": cords_to_list(police_cords),
+            "thief": cords_to_list(thief_cords),
+        }
 
     def _reset(self):
-        # global observation from god's view
-        self.global_ob = {
-            # police go from map center, so that it must go toward a random direction to catch thief
-            "police": [(random.randint(*self._police_range), random.randint(*self._police_range))
-                       for _ in range(self.team_size["police"])],
-            # make thief away from center
-            "thief": [self.add_one_thief() for _ in range(self.team_size["thief"])],
+        # to replay this episode(e.g. to profile a slow one), set np_random.bit_generator.state back to it
+        self.reset_rng_state = self.np_random.bit_generator.state
 
-        }
+        # global observation from god's view
+        self.global_ob = self._get_init_state()
         self.current_state = self.global_ob  # todo: needs to split ob for each agent in MA
+        self.static_field = StaticDistanceField(self.map_size, self.global_ob["thief"]) \
+            if self._can_use_static_field() else None
         self.elapsed_steps = 0
         self.episode_count += 1
         self.current_is_caught = False
         self.reward_hist = []  # reward of current ep
-        ob = self._trans_state(self.global_ob)
+        ob = self._get_ob()
         return ob
 
     def _close(self):
@@ -188,6 +325,9 @@ class PoliceKillAllEnv(gym.Env):
         if not isinstance(police_actions, (np.ndarray, list)):
             police_actions = [police_actions]  # be compatible with MA env.
 
+        if self.int_engine is not None:
+            return self._everybody_move_by_int_engine(cur_state, police_actions)
+
         new_state = cur_state.copy()
 
         thief_list = cur_state['thief']
@@ -215,6 +355,25 @@ class PoliceKillAllEnv(gym.Env):
         new_state['police'] = police_new_loc
         return new_state
 
+    def _everybody_move_by_int_engine(self, cur_state, police_actions):
+        """the same as everybody_move, but with int arrays"""
+        engine = self.int_engine
+        new_state = cur_state.copy()
+        police_cords = engine.to_array(cur_state['police'])
+
+        if self.adversary_action == "static":
+            thief_new_loc = cur_state['thief']
+        elif self.adversary_action == "simple":
+            thief_new_loc = engine.to_list(
+                engine.move_thief_simple(engine.to_array(cur_state['thief']), police_cords))
+        else:
+            thief_new_loc = engine.to_list(
+                engine.move_thief_random(engine.to_array(cur_state['thief']), self.np_random))
+
+        new_state['thief'] = thief_new_loc
+        new_state['police'] = engine.to_list(engine.move_police(police_cords, police_actions))
+        return new_state
+
     def _police_move_by_discret(self, police_list, police_actions):
         # Accpet a discret action (up/down/left/right)
         police_new_loc = police_list.copy()
@@ -228,7 +387,8 @@ class PoliceKillAllEnv(gym.Env):
                 _p = police_list[_i]
                 _p = (_p[0] + police_dir[0], _p[1] + police_dir[1])
                 _p = self.ensure_inside(_p)
-                police_new_loc[_i] = _p
+                if self.game_map is None or self.game_map.can_move(police_list[_i], _p):
+                    police_new_loc[_i] = _p  # otherwise blocked by wall, keep the same
 
         return police_new_loc
 
@@ -265,8 +425,11 @@ class PoliceKillAllEnv(gym.Env):
 
         return police_new_loc
 
-    def _step(self, action):
-        """firstly move, then check distance"""
+    def _tick(self, action):
+        """Run one game tick: firstly move, then check distance
+        return kill_num of this tick, ob is not built here
+        """
+        self.police_nearest_dist = None
         new_state = self.everybody_move(self.current_state, action)
         new_state, kill_num = self.check_thief_caught(new_state)
         self.current_is_caught = kill_num > 0
@@ -275,11 +438,21 @@ class PoliceKillAllEnv(gym.Env):
         self.current_state = new_state
         self.current_action = action
         self.elapsed_steps += 1
+        return kill_num
 
-        ob = self._trans_state(self.current_state)
-        self.current_done = self._cal_done(self.current_state, kill_num)
-        reward = self._cal_reward(kill_num, self.current_done)
-
+    def _step(self, action):
+        """repeat action for frame_skip ticks and sum up reward
+        ob is built only once at the end, so skipped ticks don't pay for grid building
+        """
+        reward = 0
+        for _ in range(self.frame_skip):
+            kill_num = self._tick(action)
+            self.current_done = self._cal_done(self.current_state, kill_num)
+            reward = reward + self._cal_reward(kill_num, self.current_done)
+            if self.current_done:
+                break  # don't tick on a finished game
+
+        ob = self._get_ob()
         info = self._get_step_info()
 
         return ob, reward, self.current_done, info
@@ -296,22 +469,50 @@ class PoliceKillAllEnv(gym.Env):
         """
         new_state = cur_state.copy()
 
-        thief_list = new_state['thief']
-        police_list = new_state['police']
-
-        survived_thief_list = []
-        for _thief in thief_list:
-            closed_police = [_p for _p in police_list
-                             if self.calc_dist(_thief, _p) <= self.min_catch_dist]
-            if not closed_police:
-                survived_thief_list.append(_thief)
-
-        new_state['thief'] = survived_thief_list
+        caught = self._caught_mask(new_state)
+        if self.static_field is not None:
+            self.static_field.remove(caught)
+        new_state['thief'] = [_thief for _thief, _c in zip(cur_state['thief'], caught) if not _c]
 
         kill_num = len(cur_state["thief"]) - len(new_state["thief"])
 
         return new_state, kill_num
 
+    def _caught_mask(self, state):
+        """whether each thief of state is caught, dist to nearest thief of each police is kept for reward"""
+        if self.int_engine is not None:
+            return self._int_caught_mask(state)
+
+        thief_list, police_list = state['thief'], state['police']
+        # dist in cmp unit(e.g. squared for l2) of each thief to each police
+        cmp_dist = self.dist_kernel.pairwise_cmp(thief_list, police_list)
+        caught = np.any(cmp_dist <= self.dist_kernel.cmp_radius(self.min_catch_dist), axis=1)
+        if len(thief_list):
+            self.police_nearest_dist = self.dist_kernel.cmp_to_dist(cmp_dist.min(axis=0))
+        return caught
+
+    def _int_caught_mask(self, state):
+        """by int engine, whether each thief is caught"""
+        engine = self.int_engine
+        police_cords = engine.to_array(state['police'])
+        if self.static_field is None:
+            thief_cords = engine.to_array(state['thief'])
+            caught, all_dist = engine.caught_mask(thief_cords, police_cords, self.min_catch_dist)
+            if len(thief_cords):
+                self.police_nearest_dist = all_dist.min(axis=0)
+        else:
+            # O(1) lookup per police, only police close enough to a thief need the exact check
+            self.police_nearest_dist = self.nearest_thief_dist(police_cords)
+            caught, _ = engine.caught_mask(self.static_field.alive_targets(),
+                                           police_cords[self.police_nearest_dist <= self.min_catch_dist],
+                                           self.min_catch_dist)
+        return caught
+
+    def nearest_thief_dist(self, police_cords):
+        """dist from each police to its nearest thief, by table lookup of the static field(thieves never move)"""
+        assert self.static_field is not None
+        return self.static_field.lookup(police_cords)[0]
+
     def _get_avail_new_loc(self, my_pos, my_speed):
         x, y = my_pos
         available_direction = [
@@ -328,23 +529,26 @@ class PoliceKillAllEnv(gym.Env):
         ]
 
         available_loc = [_l for i, _l in enumerate(new_location) if available_direction[i]]
+        if self.game_map is not None:
+            # stay if walls block all ways
+            available_loc = [_l for _l in available_loc if self.game_map.can_move(my_pos, _l)] or [my_pos]
         return available_loc
 
     def _take_simple_action(self, my_pos, adversary_list, team="thief"):
         """take a little clever action"""
         available_loc = self._get_avail_new_loc(my_pos, self.teams[team]['speed'])
 
-        new_dist = [self.get_position_rating(my_new_pos, adversary_list) for my_new_pos in available_loc]
+        new_dist = self.get_position_ratings(available_loc, adversary_list)
 
-        func = max if team == "thief" else min
-        best_choice = func(enumerate(new_dist), key=lambda x: x[1])[0]
+        # take the first best one
+        best_choice = np.argmax(new_dist) if team == "thief" else np.argmin(new_dist)
         my_final_pos = available_loc[best_choice]
         return my_final_pos
 
     def _take_random_action(self, my_pos, team="thief"):
         """Take a random walk"""
         available_loc = self._get_avail_new_loc(my_pos, self.teams[team]['speed'])
-        return random.choice(available_loc)
+        return available_loc[self.np_random.integers(len(available_loc))]
 
     def _render(self, mode='human', close=False):
         if not self.current_state:
@@ -356,20 +560,9 @@ class PoliceKillAllEnv(gym.Env):
             self.game_dashboard.update_plots(env_data)
         return
 
-    def get_position_rating(self, my_new_pos, adversary_list):
-        all_dist = [self.calc_dist(my_new_pos, _ad) for _ad in adversary_list]
-        return sum(all_dist)
-
-    def calc_dist(self, pos1, pos2):
-        """manhatton dist"""
-        _coords1 = np.array(pos1)  # location of me
-        _coords2 = np.array(pos2)
-        return np.sum(abs(_coords1 - _coords2))
-
-        # # calc Euclidean Distance
-        # # alternative way: np.linalg.norm(_coords1 - _coords2)
-        # eucl_dist = np.sqrt(np.sum((_coords1 - _coords2) ** 2))
-        # return eucl_dist
+    def get_position_ratings(self, my_new_pos_list, adversary_list):
+        """rating of each new position: sum of dist to all adversaries, by one batched call"""
+        return np.sum(self.dist_kernel.pairwise(my_new_pos_list, adversary_list), axis=1)
 
     def _get_zero_grid(self):
         grid_num = self.map_size * self.grid_scale
@@ -386,34 +579,64 @@ class PoliceKillAllEnv(gym.Env):
         thematrix = self._get_zero_grid()
 
         # step2. analyze state and append data attribute to each object
+        self._fill_grid(state, thematrix)
 
-        # 2.1 split axis by grid num
-
-        # 2.2 add up player's and npc data
+        return thematrix
 
+    def _fill_grid(self, state, thematrix):
+        """add up player's and npc data into a zero grid(or a view of it)"""
         for team in self.teams.keys():
-            for _p in state[team]:
-                _grid_cord = self._get_grid_cord(_p)
-
-                _channel = GRID_CHANNELS[team]["num"]
-                thematrix[tuple(_grid_cord)][_channel] += 1
+            _grid_cords = self._get_grid_cords(state[team])
+            _channel = GRID_CHANNELS[team]["num"]
+            np.add.at(thematrix, (_grid_cords[:, 0], _grid_cords[:, 1], _channel), 1)
 
         thematrix[:, :, GRID_CHANNELS["thief"]["num"]] /= self.adversary_num
 
-        return thematrix
+    def build_local_grids(self, state):
+        """egocentric window of the grid centered on each police, (N, window, window, depth)
+        out of map part is zero padding
+        """
+        grid_num = self.map_size * self.grid_scale
+        radius = self.local_window // 2
+        if self._padded_grid is None:
+            self._padded_grid = np.zeros((grid_num + 2 * radius, grid_num + 2 * radius, GRID_DEPTH))
+            # window starting at each padded cell, as a view: (start_x, start_y, window, window, depth)
+            self._local_windows = window_view(self._padded_grid, self.local_window)
+
+        self._padded_grid.fill(0)
+        self._fill_grid(state, self._padded_grid[radius:radius + grid_num, radius:radius + grid_num])
+
+        # window of police at grid (x, y) starts at padded (x, y), fancy index is the only copy
+        police_grid_cords = self._get_grid_cords(state["police"])
+        return self._local_windows[police_grid_cords[:, 0], police_grid_cords[:, 1]]
+
+    def build_grid_pyramid(self, state):
+        """(local crop of each police, global grid pooled by each of pyramid_factors)
+        the grid pyramid is updated incrementally with cells of this state, instead of rebuilding all grids
+        """
+        if self.grid_pyramid is None:
+            self.grid_pyramid = GridPyramid(
+                self.map_size * self.grid_scale, GRID_DEPTH, self.local_window, self.pyramid_factors)
+
+        team_cells = []
+        for team in self.teams.keys():
+            _grid_cords = self._get_grid_cords(state[team])
+            _channel = np.full((len(_grid_cords), 1), GRID_CHANNELS[team]["num"])
+            team_cells.append(np.hstack([_grid_cords, _channel]))
+        self.grid_pyramid.update(np.concatenate(team_cells))
+
+        local_grids = self.grid_pyramid.local_crops(self._get_grid_cords(state["police"])) * self._channel_scale
+        return tuple([local_grids[0] if self.agent_num == 1 else local_grids] +
+                     [_level * self._channel_scale for _level in self.grid_pyramid.levels])
 
-    def _get_grid_cord(self, raw_cord):
-        """According to raw axis position, calc new grid cordination
+    def _get_grid_cords(self, raw_cords):
+        """According to raw axis position, calc (n, 2) grid cordinations of a cord list
         note 1 is the raw grid size
         """
-        new_scaled_cord = np.array(raw_cord) * self.grid_scale
-        new_scaled_cord = new_scaled_cord.astype(int)  # transform to grid number
-
-        # handle max edge
-        for _axis in [0, 1]:
-            if new_scaled_cord[_axis] == self.map_size * self.grid_scale:
-                new_scaled_cord[_axis] = new_scaled_cord[_axis] - 1
-        return new_scaled_cord
+        grid_num = self.map_size * self.grid_scale
+        new_scaled_cords = (np.array(raw_cords, dtype=float).reshape(-1, 2) * self.grid_scale).astype(int)
+        new_scaled_cords[new_scaled_cords == grid_num] = grid_num - 1  # handle max edge
+        return new_scaled_cords
 
     def close(self, *args, **kwargs):
         pass  # close will trigger render(don't need it in many case)
@@ -2,9 +2,10 @@ from collections import defaultdict
 import gym
 import gym.spaces
 import numpy as np
-import random
 
 from .police_base import PoliceKillAllEnv
+from gym_sandbox.envs.utils.spawn import cords_to_list
+from gym_sandbox.envs.utils.entity_pool import EntityPool
 from gym_sandbox.envs.plot import balls_game_dashboard
 
 
@@ -15,8 +16,12 @@ class RandomBallsEnv(PoliceKillAllEnv):
     1. Thief are incremently added into map in each step
     2. Each add batch has random num of thief
     3. Thief walk in a random way
+    Alive thieves live in a fixed capacity EntityPool, state["thief"] is the (n, 2) cords array read from it.
     """
-    def __init__(self, init_thief_num=1, step_add_thief_max=3, **kwargs):
+    def __init__(self, init_thief_num=1, step_add_thief_max=3, thief_capacity=None, **kwargs):
+        """thief_capacity: max alive thief num at the same time, adversary_num by default
+        when the pool is full, new thieves wait until some are caught
+        """
         super().__init__(**kwargs)
 
         self.step_add_thief_max = step_add_thief_max
@@ -24,19 +29,52 @@ class RandomBallsEnv(PoliceKillAllEnv):
         self.team_size[self.adversary_team] = init_thief_num
         self.rest_thief_num = self.adversary_num - init_thief_num
 
-    def _step(self, action):
-        # add some thief in
-        random_num = random.choice(range(1, self.step_add_thief_max))
-        add_num = min(random_num, self.rest_thief_num)
-        self.rest_thief_num -= add_num
-        for i in range(add_num):
-            self.current_state['thief'].append(self.add_one_thief())
+        # all thieves of an episode are drawn at reset into a capacity array, and released batch by batch
+        # cords stay int only with int speeds, a speed like 0.5 needs float cords
+        cord_dtype = int if isinstance(self.teams['thief']['speed'], int) else float
+        self.thief_spawn_cords = np.zeros((self.adversary_num, 2), dtype=cord_dtype)
+        self.thief_pool = EntityPool(thief_capacity or self.adversary_num, dtype=cord_dtype)
 
-        return super()._step(action)
+    def _can_use_static_field(self):
+        return False  # thieves are added midway
 
-    def _reset(self):
-        self.rest_thief_num = self.adversary_num - self.init_thief_num
-        return super()._reset()
+    def _tick(self, action):
+        # add some thief in, each tick (also the skipped ones) has a chance to spawn
+        random_num = int(self.np_random.integers(1, self.step_add_thief_max))
+        add_num = min(random_num, self.rest_thief_num, self.thief_pool.free_num)
+        self._release_thief(add_num)
+        self.current_state['thief'] = self.thief_pool.alive_cords()
+
+        return super()._tick(action)
+
+    def _release_thief(self, num):
+        """spawn next num thieves of the capacity array into the pool"""
+        start = self.adversary_num - self.rest_thief_num
+        self.rest_thief_num -= num
+        return self.thief_pool.spawn(self.thief_spawn_cords[start:start + num])
+
+    def _get_init_state(self):
+        police_cords, self.thief_spawn_cords = self.spawn_sampler.sample(
+            self.team_size["police"], self.adversary_num)
+        self.rest_thief_num = self.adversary_num
+        self.thief_pool.clear()
+        self._release_thief(min(self.init_thief_num, self.thief_pool.capacity))
+        return {
+            "police": cords_to_list(police_cords),
+            "thief": self.thief_pool.alive_cords(),
+        }
+
+    def check_thief_caught(self, cur_state):
+        """moved thieves are written back into the pool, caught ones are killed in it"""
+        new_state = cur_state.copy()
+        slots = self.thief_pool.alive_slots()  # same order as cur_state["thief"]
+        self.thief_pool.cords[slots] = np.reshape(cur_state['thief'], (-1, 2))
+
+        caught = self._caught_mask(new_state)
+        self.thief_pool.kill(slots[caught])
+        new_state['thief'] = self.thief_pool.alive_cords()
+
+        return new_state, int(caught.sum())
 
     def _cal_done(self, state, kill_num):
         all_killed = self.rest_thief_num <= 0 and len(state["thief"]) == 0
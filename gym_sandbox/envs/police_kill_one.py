@@ -2,7 +2,6 @@ from collections import defaultdict
 import gym
 import gym.spaces
 import numpy as np
-import random
 
 from .police_base import PoliceKillAllEnv
 from gym_sandbox.envs.plot import balls_game_dashboard
@@ -21,14 +20,7 @@ class PoliceKillOneEnv(PoliceKillAllEnv):
 
     def check_thief_caught(self, cur_state):
         # don't change state here! keep killed thief in state so that state shape is fixed
-        thief_list = cur_state['thief']
-        police_list = cur_state['police']
-
-        kill_num = 0
-        for _thief in thief_list:
-            for _police in police_list:
-                if self.calc_dist(_thief, _police) <= self.min_catch_dist:
-                    kill_num = 1
-                    break
+        # one pairwise pass, it also fills police_nearest_dist for dense reward
+        kill_num = int(self._caught_mask(cur_state).any())
 
         return cur_state, kill_num
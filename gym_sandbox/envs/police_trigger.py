@@ -2,7 +2,6 @@ from collections import defaultdict
 import gym
 import gym.spaces
 import numpy as np
-import random
 
 from .police_base import PoliceKillAllEnv, MOVE_ACTIONS
 from gym_sandbox.envs.plot import balls_game_dashboard
@@ -13,20 +12,28 @@ class PoliceTriggerEnv(PoliceKillAllEnv):
     Focus on Multi-Task
     Police must get close to thief, AND PULL TRIGGER!
     So there're 2 types of action: move and trigger, and they need co-operation
+    Multi agent: action is one int per police, triggers of all police are resolved in one batched check
     """
+    TRIGGER = len(MOVE_ACTIONS)
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.action_space = gym.spaces.Discrete(len(MOVE_ACTIONS) + 1)
+        self.action_space = gym.spaces.Discrete(self.TRIGGER + 1) if self.agent_num == 1 \
+            else gym.spaces.MultiDiscrete([[0, self.TRIGGER]] * self.agent_num)
 
-    def _step(self, action):
+    def _tick(self, action):
         """action space is (0~4), move is the same, 4 is pull trigger
-        firstly check police pull trigger, then move
+        firstly check police pull trigger, then move(police pulling trigger don't move)
         """
+        self.police_nearest_dist = None
         new_state = self.current_state.copy()
         kill_num = 0
 
-        if action == 4:  # pull trigger
-            new_state, kill_num = self.check_thief_caught(new_state)
+        firing = np.zeros(len(new_state['police']), dtype=bool)
+        _actions = np.asarray(action).ravel()
+        firing[:len(_actions)] = _actions == self.TRIGGER
+        if firing.any():  # pull trigger
+            new_state, kill_num = self.check_thief_caught(new_state, firing)
 
         new_state = self.everybody_move(new_state, action)
 
@@ -36,12 +43,19 @@ class PoliceTriggerEnv(PoliceKillAllEnv):
         self.current_state = new_state
         self.current_action = action
         self.elapsed_steps += 1
+        return kill_num
 
-        ob = self._trans_state(self.current_state)
-        self.current_done = self._cal_done(self.current_state, kill_num)
-        reward = self._cal_reward(kill_num, self.current_done)
-
-        info = self._get_step_info()
-
-        return ob, reward, self.current_done, info
-
+    def check_thief_caught(self, cur_state, firing=None):
+        """only police pulling trigger(bool mask of police) can catch, all police by default
+        dist matrix is only calculated for the firing police.
+        Catch is checked before the move here, so its dists are never reused as police_nearest_dist:
+        dense reward needs the dists after the move and does its own pass over all police
+        """
+        if firing is None or firing.all():
+            new_state, kill_num = super().check_thief_caught(cur_state)
+        else:
+            firing_state = dict(cur_state, police=[_p for _p, _f in zip(cur_state['police'], firing) if _f])
+            new_state, kill_num = super().check_thief_caught(firing_state)
+            new_state['police'] = cur_state['police']
+        self.police_nearest_dist = None  # before the move, see above
+        return new_state, kill_num
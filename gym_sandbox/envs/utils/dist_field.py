@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from gym_sandbox.envs.utils.dist_kernel import get_dist_kernel
+
+L1 = get_dist_kernel("l1")
+
+NO_TARGET_DIST = np.iinfo(np.int32).max
+
+
+class StaticDistanceField:
+    """Manhattan dist from every int cord of the map to the nearest alive target, and which target it is
+    Targets never move, so the field is computed once, then only cells whose nearest target is removed
+    are updated. Any query of an int cord is then a table lookup.
+    """
+    def __init__(self, map_size, target_cords):
+        self.targets = np.array(target_cords, dtype=np.int32).reshape(-1, 2)
+        self.alive = np.ones(len(self.targets), dtype=bool)
+
+        _axis = np.arange(map_size + 1, dtype=np.int32)
+        self._cells = np.stack(np.meshgrid(_axis, _axis, indexing='ij'), axis=2)  # (S, S, 2), cell (x, y) is [x, y]
+        self.dist = np.empty((map_size + 1, map_size + 1), dtype=np.int32)
+        self.nearest = np.empty((map_size + 1, map_size + 1), dtype=np.int64)
+        self._update(np.ones(self.dist.shape, dtype=bool))
+
+    def _update(self, cell_mask):
+        alive_index = np.flatnonzero(self.alive)
+        if not len(alive_index):
+            self.dist[cell_mask] = NO_TARGET_DIST
+            self.nearest[cell_mask] = -1
+            return
+
+        all_dist = L1.pairwise_cmp(self._cells[cell_mask], self.targets[alive_index])
+        _nearest = all_dist.argmin(axis=1)
+        self.dist[cell_mask] = all_dist[np.arange(len(all_dist)), _nearest]
+        self.nearest[cell_mask] = alive_index[_nearest]
+
+    def lookup(self, cords):
+        """(dist to nearest alive target, index of it) of each int cord"""
+        return self.dist[cords[:, 0], cords[:, 1]], self.nearest[cords[:, 0], cords[:, 1]]
+
+    def alive_targets(self):
+        return self.targets[self.alive]
+
+    def remove(self, alive_mask):
+        """remove targets by a mask over alive targets, in the same order as alive_targets()"""
+        removed = np.flatnonzero(self.alive)[alive_mask]
+        if not len(removed):
+            return
+        self.alive[removed] = False
+        self._update(np.isin(self.nearest, removed))
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Batched distance kernels shared by catch detection, thief AI and reward.
+Select one by name: get_dist_kernel("l1"/"l2"/"chebyshev")
+
+Each kernel also has a "cmp" variant, which keeps the order of dist but is cheaper to compute,
+e.g. squared dist of l2, so that comparing and sorting dist never need sqrt.
+Turn it back into real dist by cmp_to_dist only when the value itself is needed.
+"""
+import numpy as np
+
+
+def _as_cords(cords):
+    """list of (x, y) or an array -> (n, 2) array, int cords stay int"""
+    return np.asarray(cords).reshape(-1, 2)
+
+
+def _l1(diff):
+    return np.sum(np.abs(diff), axis=-1)
+
+
+def _l2_sq(diff):
+    return np.sum(diff ** 2, axis=-1)
+
+
+def _chebyshev(diff):
+    return np.max(np.abs(diff), axis=-1)
+
+
+class DistKernel:
+    supports_norm = True  # dist is a function of cord difference, norm/cmp_norm work
+
+    def __init__(self, name, cmp_norm, cmp_to_dist=None, dist_to_cmp=None):
+        self.name = name
+        self._cmp_norm = cmp_norm
+        # cmp value is the dist itself if no conversion is given
+        self._cmp_to_dist = cmp_to_dist or (lambda _v: _v)
+        self._dist_to_cmp = dist_to_cmp or (lambda _v: _v)
+
+    # ---- on cord differences (..., 2) ----
+    def norm(self, diff):
+        return self._cmp_to_dist(self._cmp_norm(diff))
+
+    def cmp_norm(self, diff):
+        return self._cmp_norm(diff)
+
+    def cmp_to_dist(self, cmp_value):
+        return self._cmp_to_dist(cmp_value)
+
+    def cmp_radius(self, radius):
+        """radius in cmp unit, so that cmp <= cmp_radius(r) means dist <= r"""
+        return self._dist_to_cmp(radius)
+
+    # ---- on cords ----
+    def dist(self, pos1, pos2):
+        """point to point"""
+        return self.norm(np.asarray(pos1) - np.asarray(pos2))
+
+    def pairwise(self, cords1, cords2):
+        """set to set, (n1, n2)"""
+        return self.cmp_to_dist(self.pairwise_cmp(cords1, cords2))
+
+    def pairwise_cmp(self, cords1, cords2):
+        """set to set in cmp unit(e.g. squared for l2), (n1, n2)"""
+        return self._cmp_norm(_as_cords(cords1)[:, None, :] - _as_cords(cords2)[None, :, :])
+
+
+DIST_KERNELS = {
+    "l1": DistKernel("l1", _l1),
+    "l2": DistKernel("l2", _l2_sq, cmp_to_dist=np.sqrt, dist_to_cmp=lambda _r: _r ** 2),
+    "chebyshev": DistKernel("chebyshev", _chebyshev),
+}
+
+
+def get_dist_kernel(name):
+    if name not in DIST_KERNELS:
+        raise ValueError('Unknown dist kernel: %s, choose from %s' % (name, list(DIST_KERNELS)))
+    return DIST_KERNELS[name]
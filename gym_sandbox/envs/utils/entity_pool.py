@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+class EntityPool:
+    """Fixed capacity pool of entity cords
+    Cords of all slots are preallocated, an alive mask tells used slots, and free slots are kept in a stack
+    (free-list), so no list is rebuilt. Alive slots are also kept in spawn order(the same order as appending
+    to a list and dropping killed ones):
+        spawn: O(spawned num), slots are appended to the order
+        kill: O(spawned num) plus one vectorized compaction of the order, O(alive num), per call
+        alive_slots: O(1), a view
+    """
+    def __init__(self, capacity, dtype=int):
+        self.capacity = capacity
+        self.cords = np.zeros((capacity, 2), dtype=dtype)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self._free = np.empty(capacity, dtype=np.int64)  # stack of free slots, top is at free_num - 1
+        self._order = np.empty(capacity, dtype=np.int64)  # alive slots in spawn order, first len(self) are used
+        self.free_num = 0
+        self.clear()
+
+    def clear(self):
+        self.alive[:] = False
+        self._free[:] = np.arange(self.capacity)[::-1]  # so that slot 0 is used first
+        self.free_num = self.capacity
+
+    def __len__(self):
+        return self.capacity - self.free_num
+
+    def spawn(self, cords):
+        """put entities into free slots, return their slots"""
+        cords = np.asarray(cords).reshape(-1, 2)
+        num = len(cords)
+        assert num <= self.free_num, "entity pool is full"
+        alive_num = len(self)
+        slots = self._free[self.free_num - num:self.free_num][::-1].copy()
+        self.free_num -= num
+        self.cords[slots] = cords
+        self.alive[slots] = True
+        self._order[alive_num:alive_num + num] = slots
+        return slots
+
+    def kill(self, slots):
+        """free the slots, cords stay there but are never read again"""
+        num = len(slots)
+        if not num:
+            return
+        alive_num = len(self)
+        self.alive[slots] = False
+        self._free[self.free_num:self.free_num + num] = slots
+        self.free_num += num
+        order = self._order[:alive_num]
+        self._order[:alive_num - num] = order[self.alive[order]]
+
+    def alive_slots(self):
+        """slots of alive entities in spawn order, a view that changes on next spawn/kill"""
+        return self._order[:len(self)]
+
+    def alive_cords(self):
+        """(alive num, 2) cords in spawn order, what observations and renderers read"""
+        return self.cords[self.alive_slots()]
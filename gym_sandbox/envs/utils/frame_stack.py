@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import gym
+import gym.spaces
+import numpy as np
+
+
+class FrameStack:
+    """Last k frames stacked along the last axis(channels-last), oldest first
+    The preallocated buffer holds 2k frames and each frame is written twice(at i and i + k),
+    so the last k frames are always one contiguous channel range: the stacked state is a view, never reallocated.
+    The view is only valid until next push, copy it if it's kept.
+    """
+    def __init__(self, frame_shape, k, dtype=np.float32):
+        self.k = k
+        self.channels = frame_shape[-1]
+        self.buffer = np.zeros(tuple(frame_shape[:-1]) + (2 * k * self.channels,), dtype=dtype)
+        self.pos = 0  # where the next frame goes
+        self.count = 0
+
+    def reset(self):
+        self.pos = 0
+        self.count = 0
+
+    def push(self, frame):
+        c = self.channels
+        for _start in (self.pos, self.pos + self.k):
+            self.buffer[..., _start * c:(_start + 1) * c] = frame
+        self.pos = (self.pos + 1) % self.k
+        self.count = min(self.count + 1, self.k)
+
+    def full(self):
+        return self.count == self.k
+
+    def state(self):
+        """(..., k * channels) view of the last k frames"""
+        c = self.channels
+        return self.buffer[..., self.pos * c:(self.pos + self.k) * c]
+
+
+class FrameStackWrapper(gym.Wrapper):
+    """Stack the last k obs of a grid env(Box ob, channels-last), at reset the first ob fills all k
+    ob returned is a view of the stack, copy it if it's kept after next step
+    """
+    def __init__(self, env, k):
+        super().__init__(env)
+        space = env.observation_space
+        assert isinstance(space, gym.spaces.Box)
+        self.frame_stack = FrameStack(space.shape, k)
+        self.observation_space = gym.spaces.Box(
+            float(np.min(space.low)), float(np.max(space.high)),
+            self.frame_stack.state().shape)
+
+    def _reset(self):
+        ob = self.env.reset()
+        self.frame_stack.reset()
+        for _ in range(self.frame_stack.k):
+            self.frame_stack.push(ob)
+        return self.frame_stack.state()
+
+    def _step(self, action):
+        ob, reward, done, info = self.env.step(action)
+        self.frame_stack.push(ob)
+        return self.frame_stack.state(), reward, done, info
@@ -1,11 +1,210 @@
 # -*- coding: utf-8 -*-
+"""
+Map logic: walls/obstacles on the int cords of a square map, and precomputed navigation fields.
+
+A map is a bitmap of (map_size+1, map_size+1) cells, True means wall.
+The navigation field is the BFS(4 direction, unit step) dist between any 2 cells,
+so geodesic dist, catch check and thief AI on the map are all table lookups.
+As it's (cell num)^2, it's only for small/medium maps, map_size <= MAX_NAV_MAP_SIZE.
+Fields are cached on disk keyed by map hash, so workers load it instead of running BFS again.
+"""
+import hashlib
+import os
+
 import numpy as np
 
+from gym_sandbox.envs.utils.dist_kernel import get_dist_kernel
+
+UNREACHABLE = np.iinfo(np.int16).max
+# largest map with a navigation field: 65^4 int16 is ~36MB(and the BFS needs about twice that),
+# the default map_size 200 would need ~3GB
+MAX_NAV_MAP_SIZE = 64
+NAV_CACHE_DIR = os.environ.get("GYM_SANDBOX_NAV_CACHE", os.path.expanduser("~/.gym_sandbox/nav_cache"))
+
 
 def calc_eucl_dist(pos1, pos2):
     # calc Euclidean Distance
-    _coords1 = np.array(pos1)  # location of me
-    _coords2 = np.array(pos2)
-    # alternative way: np.linalg.norm(_coords1 - _coords2)
-    eucl_dist = np.sqrt(np.sum((_coords1 - _coords2) ** 2))
-    return eucl_dist
+    return get_dist_kernel("l2").dist(pos1, pos2)
+
+
+def _cross_walls(map_size):
+    """a cross wall through the center, with a door in each arm"""
+    walls = np.zeros((map_size + 1, map_size + 1), dtype=bool)
+    center, door = map_size // 2, max(1, map_size // 4)
+    walls[center, :] = True
+    walls[:, center] = True
+    for _d in (door, map_size - door):
+        walls[center, _d] = walls[_d, center] = False
+    return walls
+
+
+def _pillars_walls(map_size):
+    """2x2 pillars every 4 cells"""
+    walls = np.zeros((map_size + 1, map_size + 1), dtype=bool)
+    for _x in range(2, map_size - 1, 4):
+        for _y in range(2, map_size - 1, 4):
+            walls[_x:_x + 2, _y:_y + 2] = True
+    return walls
+
+
+# builtin maps, name -> walls of a given map size
+MAPS = {
+    "empty": lambda map_size: np.zeros((map_size + 1, map_size + 1), dtype=bool),
+    "cross": _cross_walls,
+    "pillars": _pillars_walls,
+}
+
+
+class GameMap:
+    def __init__(self, walls):
+        self.walls = np.asarray(walls, dtype=bool)
+        assert self.walls.ndim == 2 and self.walls.shape[0] == self.walls.shape[1]
+        self.map_size = self.walls.shape[0] - 1
+        self.map_hash = hashlib.sha1(self.to_bitmap() + str(self.walls.shape).encode()).hexdigest()
+        self._nav_dist = None
+        self._max_nav_dist = None
+        self._geodesic_kernel = None
+
+    # ---- load ----
+    @classmethod
+    def from_bitmap(cls, bitmap, map_size):
+        """bitmap: bytes of np.packbits(walls), the compact form of a map"""
+        cell_num = (map_size + 1) ** 2
+        walls = np.unpackbits(np.frombuffer(bitmap, dtype=np.uint8))[:cell_num]
+        return cls(walls.reshape(map_size + 1, map_size + 1))
+
+    @classmethod
+    def from_ascii(cls, rows):
+        """rows of '#'(wall) and '.'(free), row i is x=i"""
+        return cls([[_c == '#' for _c in _row] for _row in rows])
+
+    @classmethod
+    def from_name(cls, name, map_size):
+        return cls(MAPS[name](map_size))
+
+    def to_bitmap(self):
+        return np.packbits(self.walls.ravel()).tobytes()
+
+    # ---- query ----
+    def is_free(self, cords):
+        """cords: (n, 2) int array"""
+        return ~self.walls[cords[:, 0], cords[:, 1]]
+
+    def can_move(self, src, dst):
+        """a straight move along one axis, all cells on the way(including dst) must be free
+        a diagonal move must be free along one of its 2 L shaped ways
+        """
+        (x0, y0), (x1, y1) = src, dst
+        if x0 != x1 and y0 != y1:
+            return (self.can_move(src, (x1, y0)) and self.can_move((x1, y0), dst)) or \
+                   (self.can_move(src, (x0, y1)) and self.can_move((x0, y1), dst))
+        if x0 == x1:
+            path = self.walls[x0, min(y0, y1):max(y0, y1) + 1]
+        else:
+            path = self.walls[min(x0, x1):max(x0, x1) + 1, y0]
+        return not path.any()
+
+    def _cell_index(self, cords):
+        cords = np.asarray(cords, dtype=np.int64).reshape(-1, 2)
+        return cords[:, 0] * (self.map_size + 1) + cords[:, 1]
+
+    # ---- navigation field ----
+    def _check_nav_size(self):
+        assert self.map_size <= MAX_NAV_MAP_SIZE, \
+            "map_size %d is too large for a navigation field, max is %d" % (self.map_size, MAX_NAV_MAP_SIZE)
+
+    @property
+    def nav_dist(self):
+        """(cell num, cell num) BFS dist, loaded from disk cache or computed once"""
+        if self._nav_dist is None:
+            self._check_nav_size()
+            self._nav_dist = self._load_or_build_nav_dist()
+        return self._nav_dist
+
+    def _load_or_build_nav_dist(self):
+        cache_file = os.path.join(NAV_CACHE_DIR, "nav_%s.npy" % self.map_hash)
+        if os.path.exists(cache_file):
+            return np.load(cache_file, mmap_mode='r')  # workers share the same pages
+
+        nav_dist = self._build_nav_dist()
+        try:
+            os.makedirs(NAV_CACHE_DIR, exist_ok=True)
+            tmp_file = "%s.%d.tmp.npy" % (cache_file[:-len(".npy")], os.getpid())
+            np.save(tmp_file, nav_dist)
+            os.replace(tmp_file, cache_file)  # atomic, in case many workers build it at the same time
+        except OSError:
+            pass  # cache is only an optimization
+        return nav_dist
+
+    @property
+    def max_nav_dist(self):
+        """longest walk between 2 connected cells, for normalize(UNREACHABLE is not counted)"""
+        if self._max_nav_dist is None:
+            nav_dist, rows = self.nav_dist, 1024  # by chunk of rows, the table can be large
+            self._max_nav_dist = max(
+                [1] + [int(np.max(_chunk, initial=0, where=_chunk != UNREACHABLE))
+                       for _chunk in (nav_dist[_i:_i + rows] for _i in range(0, len(nav_dist), rows))])
+        return self._max_nav_dist
+
+    def _build_nav_dist(self):
+        """BFS from every cell at once, each round expands all frontiers by one step"""
+        side = self.map_size + 1
+        cell_num = side * side
+        free = ~self.walls
+
+        nav_dist = np.full((cell_num, side, side), UNREACHABLE, dtype=np.int16)
+        frontier = np.zeros((cell_num, side, side), dtype=bool)
+        free_index = np.flatnonzero(free.ravel())
+        frontier.reshape(cell_num, -1)[free_index, free_index] = True
+        visited = frontier.copy()
+
+        step = 0
+        while frontier.any():
+            nav_dist[frontier] = step
+            expanded = np.zeros_like(frontier)
+            expanded[:, 1:, :] |= frontier[:, :-1, :]
+            expanded[:, :-1, :] |= frontier[:, 1:, :]
+            expanded[:, :, 1:] |= frontier[:, :, :-1]
+            expanded[:, :, :-1] |= frontier[:, :, 1:]
+            frontier = expanded & free[None, :, :] & ~visited
+            visited |= frontier
+            step += 1
+
+        return nav_dist.reshape(cell_num, cell_num)
+
+    @property
+    def geodesic_kernel(self):
+        if self._geodesic_kernel is None:
+            self._check_nav_size()  # fail at env init, not at the first dist lookup
+            self._geodesic_kernel = GeodesicKernel(self)
+        return self._geodesic_kernel
+
+
+class GeodesicKernel:
+    """Dist kernel of walking dist on a GameMap, same interface as DistKernel on int cords
+    every dist is a lookup of the navigation field.
+    Walking dist depends on where both ends are, not on their difference, so there's no norm/cmp_norm:
+    callers check supports_norm and use pairwise_cmp on cords
+    """
+    name = "geodesic"
+    supports_norm = False
+
+    def __init__(self, game_map):
+        self.game_map = game_map
+
+    def cmp_to_dist(self, cmp_value):
+        return cmp_value
+
+    def cmp_radius(self, radius):
+        return radius
+
+    def pairwise_cmp(self, cords1, cords2):
+        index1, index2 = self.game_map._cell_index(cords1), self.game_map._cell_index(cords2)
+        # int64, so that sum of many dist never overflows
+        return self.game_map.nav_dist[index1[:, None], index2[None, :]].astype(np.int64)
+
+    def pairwise(self, cords1, cords2):
+        return self.pairwise_cmp(cords1, cords2)
+
+    def dist(self, pos1, pos2):
+        return self.pairwise_cmp([pos1], [pos2])[0, 0]
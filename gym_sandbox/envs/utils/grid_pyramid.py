@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+def window_view(padded_grid, window):
+    """all window x window crops of a padded (x, y, depth) grid, as a read-only strided view
+    view[x, y] is the crop starting at padded (x, y), i.e. centered on grid (x, y) when pad is window // 2
+    """
+    _s0, _s1, _s2 = padded_grid.strides
+    start_num_x = padded_grid.shape[0] - window + 1
+    start_num_y = padded_grid.shape[1] - window + 1
+    return np.lib.stride_tricks.as_strided(
+        padded_grid, shape=(start_num_x, start_num_y, window, window, padded_grid.shape[2]),
+        strides=(_s0, _s1, _s0, _s1, _s2), writeable=False)
+
+
+class GridPyramid:
+    """Entity counts of the world grid at full resolution and several sum-pooled resolutions
+    It's updated incrementally: each update only removes the cells of last update and adds the new ones,
+    so cost is O(entity num) per level, instead of rebuilding and pooling the whole grid.
+    Full resolution grid is zero padded by window // 2, so local crops can be taken by window_view.
+    """
+    def __init__(self, grid_num, depth, window, pool_factors=(2, 4, 8)):
+        self.pad = window // 2
+        self.pool_factors = pool_factors
+        self.full = np.zeros((grid_num + 2 * self.pad, grid_num + 2 * self.pad, depth), dtype=np.int32)
+        self.windows = window_view(self.full, window)
+        # partial blocks at the edge are pooled as if zero padded
+        self.levels = [np.zeros((-(-grid_num // _f), -(-grid_num // _f), depth), dtype=np.int32)
+                       for _f in pool_factors]
+        self._last_cells = None
+
+    def update(self, cells):
+        """cells: (n, 3) int array of [x, y, channel] of every entity"""
+        if self._last_cells is not None:
+            self._add(self._last_cells, -1)
+        self._add(cells, 1)
+        self._last_cells = cells
+
+    def _add(self, cells, value):
+        x, y, channel = cells[:, 0], cells[:, 1], cells[:, 2]
+        np.add.at(self.full, (x + self.pad, y + self.pad, channel), value)
+        for _f, _level in zip(self.pool_factors, self.levels):
+            np.add.at(_level, (x // _f, y // _f, channel), value)
+
+    def local_crops(self, center_cells):
+        """(n, window, window, depth) crops centered on each (x, y), fancy index is the only copy"""
+        return self.windows[center_cells[:, 0], center_cells[:, 1]]
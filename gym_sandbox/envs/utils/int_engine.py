@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from gym_sandbox.envs.utils.dist_kernel import get_dist_kernel
+
+L1 = get_dist_kernel("l1")
+
+# same order as police_base.MOVE_ACTIONS (up/down/left/right), last row is "don't move"
+_MOVE_TABLE = np.array([[0, -1], [0, 1], [-1, 0], [1, 0], [0, 0]], dtype=np.int32)
+NO_MOVE = len(_MOVE_TABLE) - 1
+_MOVE_AXIS = np.array([1, 1, 0, 0])  # the axis each move changes
+
+
+class IntGridEngine:
+    """Integer-only fast path of the discret game logic
+    Same rules as the python logic in PoliceKillAllEnv(discret move, 4-direction thief, Manhattan catch),
+    but positions are int32 arrays, moves are table lookups, and all distances are int.
+    Every function gives exactly the same result (and draws the same random numbers) as the original.
+    """
+    dtype = np.int32
+
+    def __init__(self, map_size, police_speed, thief_speed):
+        self.map_size = map_size
+        self.police_move_table = _MOVE_TABLE * police_speed
+        self.thief_move_table = _MOVE_TABLE[:NO_MOVE] * thief_speed
+
+    def to_array(self, cord_list):
+        return np.array(cord_list, dtype=self.dtype).reshape(-1, 2)
+
+    @staticmethod
+    def to_list(cords):
+        return [tuple(_c) for _c in cords.tolist()]
+
+    def move_police(self, police_cords, actions):
+        """actions out of move range mean don't move, police without action don't move either"""
+        actions = np.asarray(actions, dtype=int).ravel()
+        full_actions = np.full(len(police_cords), NO_MOVE)
+        # negative action works like python list index, same as MOVE_ACTIONS[_a]
+        full_actions[:len(actions)] = np.where(actions < NO_MOVE, actions % NO_MOVE, NO_MOVE)
+        new_cords = police_cords + self.police_move_table[full_actions]
+        return np.clip(new_cords, 0, self.map_size)  # ensure inside
+
+    def _thief_candidates(self, thief_cords):
+        """all 4 new locations of each thief, and whether each one is available(strictly inside map)"""
+        candidates = thief_cords[:, None, :] + self.thief_move_table[None, :, :]  # (T, 4, 2)
+        moved = candidates[:, np.arange(NO_MOVE), _MOVE_AXIS]  # a move only changes one axis, check that one
+        available = (moved > 0) & (moved < self.map_size)
+        return candidates, available
+
+    def move_thief_simple(self, thief_cords, police_cords):
+        """run away: take the first available location with max sum of Manhattan dist to all police"""
+        candidates, available = self._thief_candidates(thief_cords)
+        rating = L1.pairwise_cmp(candidates, police_cords).sum(axis=1).reshape(available.shape)
+        rating[~available] = -1  # rating of available loc is always >= 0
+        best_choice = rating.argmax(axis=1)  # argmax takes the first one, same as max()
+        return candidates[np.arange(len(thief_cords)), best_choice]
+
+    def move_thief_random(self, thief_cords, rng):
+        """random walk among available locations, draws the same numbers as one rng.integers per thief"""
+        candidates, available = self._thief_candidates(thief_cords)
+        if not len(thief_cords):
+            return thief_cords
+        choice = rng.integers(available.sum(axis=1))  # index among available ones
+        # turn index among available ones into index of all 4 candidates
+        choice = (np.cumsum(available, axis=1) <= choice[:, None]).sum(axis=1)
+        return candidates[np.arange(len(thief_cords)), choice]
+
+    def caught_mask(self, thief_cords, police_cords, min_catch_dist):
+        """whether each thief is within min_catch_dist of any police, and the (T, P) dist matrix"""
+        dist = L1.pairwise_cmp(thief_cords, police_cords)
+        return (dist <= min_catch_dist).any(axis=1), dist
+
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+
+class LazyObservation:
+    """A lightweight handle of one observation
+    It only keeps the positions of this step, the grid/cord list is built
+    when the handle is converted, e.g. np.asarray(ob) or ob.materialize()
+    So frames that nobody looks at (frame skip, warmup, reward-only eval) cost almost nothing.
+    """
+    __slots__ = ('_build_func', '_state', '_value')
+
+    def __init__(self, build_func, state):
+        self._build_func = build_func
+        # shallow copy each team list, env may append to its current lists later(e.g. RandomBallsEnv)
+        self._state = {team: list(cords) for team, cords in state.items()}
+        self._value = None
+
+    def materialize(self):
+        """build the real ob once, and drop the captured state"""
+        if self._value is None:
+            self._value = self._build_func(self._state)
+            self._state = None
+        return self._value
+
+    def __array__(self, dtype=None, copy=None):
+        value = self.materialize()
+        if not hasattr(value, 'astype'):
+            raise TypeError('LazyObservation of a %s can not be converted to array' % type(value).__name__)
+        return value if dtype is None else value.astype(dtype)
+
+    @property
+    def shape(self):
+        return self.materialize().shape
+
+    def __len__(self):
+        return len(self.materialize())
+
+    def __getitem__(self, item):
+        return self.materialize()[item]
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+def _to_seed_seq(seed):
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+
+def np_random(seed=None):
+    """Like gym.utils.seeding.np_random, but return a numpy Generator and the SeedSequence behind it
+    seed: None(fresh OS entropy)/int/SeedSequence(e.g. one of root_seed_seq.spawn(n), one for each vector env / worker)
+    seed_seq.entropy is the number to pass in again to replay the same stream
+    """
+    seed_seq = _to_seed_seq(seed)
+    return np.random.default_rng(seed_seq), seed_seq
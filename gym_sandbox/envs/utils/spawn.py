@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+class SpawnSampler:
+    """Batched sampler of spawn points, all draws come from its own numpy Generator
+    police: both x and y inside police_range (a square around map center)
+    thief: both x and y inside [0, thief_range[0]] or [thief_range[1], map_size],
+           each axis picks a side with 50% chance, so thief is away from center
+    All ranges are inclusive, the same as random.randint.
+    Pass env_num to draw spawn points for many envs in one call, result shape is (env_num, n, 2)
+    walls: (map_size+1, map_size+1) bool of a game map, points on walls are drawn again
+    """
+    def __init__(self, map_size, police_range, thief_range, rng=None, walls=None):
+        self.map_size = map_size
+        self.police_range = police_range
+        self.thief_range = thief_range
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.walls = walls
+
+    def _get_shape(self, n, env_num):
+        return (n, 2) if env_num is None else (env_num, n, 2)
+
+    def _avoid_walls(self, cords, draw_func):
+        """draw again only the points on walls, until none is"""
+        if self.walls is None:
+            return cords
+        on_wall = self.walls[cords[..., 0], cords[..., 1]]
+        while on_wall.any():
+            cords[on_wall] = draw_func(int(on_wall.sum()))
+            on_wall = self.walls[cords[..., 0], cords[..., 1]]
+        return cords
+
+    def _draw_police(self, shape):
+        low, high = self.police_range
+        return self.rng.integers(low, high, size=shape, endpoint=True)
+
+    def _draw_thief(self, shape):
+        near_side = self.rng.integers(0, self.thief_range[0], size=shape, endpoint=True)
+        far_side = self.rng.integers(self.thief_range[1], self.map_size, size=shape, endpoint=True)
+        use_far = self.rng.random(shape) < 0.5
+        return np.where(use_far, far_side, near_side)
+
+    def sample_police(self, n, env_num=None):
+        return self._avoid_walls(self._draw_police(self._get_shape(n, env_num)),
+                                 lambda _n: self._draw_police((_n, 2)))
+
+    def sample_thief(self, n, env_num=None):
+        return self._avoid_walls(self._draw_thief(self._get_shape(n, env_num)),
+                                 lambda _n: self._draw_thief((_n, 2)))
+
+    def sample(self, police_num, thief_num, env_num=None):
+        """return (police_cords, thief_cords) as int arrays"""
+        return self.sample_police(police_num, env_num), self.sample_thief(thief_num, env_num)
+
+
+def cords_to_list(cords):
+    """int array of (n, 2) -> list of (x, y) tuple of python int, which is what env state uses"""
+    return [tuple(_c) for _c in np.asarray(cords).tolist()]
@@ -148,6 +148,50 @@ register(
     )
 )
 
+"""
+Problem: Same as killall-grid/ravel, but each action is repeated for 4 ticks (frame skip).
+Pros:    Less decisions per episode, and ob(the grid) is only built once per 4 ticks.
+Tips:    timestep_limit still counts ticks of game time (env checks it by itself),
+         so an episode has at most 100/4 decisions.
+"""
+register(
+    id='police-killall-grid-skip4-v0',
+    entry_point='gym_sandbox.envs.police_base:PoliceKillAllEnv',
+    timestep_limit=100,
+
+    kwargs=dict(
+        agent_num=1, agent_team="police", adversary_num=6, map_size=10, adversary_action="simple",
+        state_format='grid3d', frame_skip=4,
+    )
+)
+
+register(
+    id='police-killall-ravel-skip4-v0',
+    entry_point='gym_sandbox.envs.police_base:PoliceKillAllEnv',
+    timestep_limit=100,
+
+    kwargs=dict(
+        agent_num=1, agent_team="police", adversary_num=6, map_size=20, adversary_action="simple",
+        state_format='grid3d_ravel', frame_skip=4,
+    )
+)
+
+"""
+Problem: Same as killall-grid, but the map has walls(a cross with 4 doors), police must go around.
+Tips:    Thief AI and catch use walking dist on the map, which is looked up from a nav field
+         precomputed once per map and cached on disk(see utils/game_map.py).
+"""
+register(
+    id='police-killall-cross-v0',
+    entry_point='gym_sandbox.envs.police_base:PoliceKillAllEnv',
+    timestep_limit=100,
+
+    kwargs=dict(
+        agent_num=1, agent_team="police", adversary_num=6, map_size=20, adversary_action="simple",
+        state_format='grid3d', game_map='cross',
+    )
+)
+
 """
 Problem: Now everything is random, can you hold on?
          Thief num is random, and randomly added into map, and action is random!
@@ -198,6 +242,23 @@ register(
     )
 )
 
+"""
+Problem: Multi agent trigger, each police moves or pulls trigger by itself.
+Tips:    action is one int(0~4) per police, ob is egocentric grid of each police,
+         both have fixed shape(agent_num, ...), so it can be stacked by a vector env.
+"""
+register(
+    id='police-killall-trigger-ma-local-v0',
+    entry_point='gym_sandbox.envs.police_trigger:PoliceTriggerEnv',
+    timestep_limit=100,
+
+    kwargs=dict(
+        agent_num=4, agent_team="police", adversary_num=5, map_size=20,
+        adversary_action="random",  # static/simple/random
+        state_format='grid3d_local',
+    )
+)
+
 """
 Problem: this is a base env for test of generalize(an idea from HRA paper), 
          which means to conquer any similar env(bigger map, more npc, action more random, etc.)
@@ -264,3 +325,19 @@ register(
         action_type='continous_vector'
     )
 )
+
+"""
+Problem: large swarm MADDPG, each agent only observes its k nearest police and thieves
+Pros:    ob size and compute scale with k, not with agent num
+"""
+register(
+    id='police-maddpg-swarm-knn-v0',
+    entry_point='gym_sandbox.envs.police_MADDPG:PoliceMADDPGEnv',
+    timestep_limit=100,
+
+    kwargs=dict(
+        agent_num=100, agent_team="police", adversary_num=20, map_size=100, adversary_action="simple",
+        state_format='cord_list_knn', knn_k=4, police_speed=0.5, thief_speed=1, min_catch_dist=1,
+        action_type='continous_vector'
+    )
+)
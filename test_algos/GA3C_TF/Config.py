@@ -51,6 +51,10 @@ class Config:
     # If the dynamic configuration is on, these are the initial values.
     # Number of Agents
     AGENTS = 8#32
+    # Max number of Agents, i.e. rows of the shared prediction slot table
+    MAX_AGENTS = 64
+    # Number of envs driven by each Agent (one prediction request per tick for all of them)
+    ENVS_PER_AGENT = 1
     # Number of Predictors
     PREDICTORS = 2
     # Number of Trainers
@@ -59,10 +63,16 @@ class Config:
     # Device
     DEVICE = 'cpu:0'
 
+    # Root seed, each agent (and its env) gets an independent stream spawned from it
+    # -1 means a fresh seed from OS entropy (printed at startup, so the run can be replayed)
+    SEED = -1
+
     # Enable the dynamic adjustment (+ waiting time to start it)
     DYNAMIC_SETTINGS = True
     DYNAMIC_SETTINGS_STEP_WAIT = 20
     DYNAMIC_SETTINGS_INITIAL_WAIT = 10
+    # Best setting found on each host, used as initial values when the dynamic configuration is on
+    DYNAMIC_SETTINGS_FILE = 'dynamic_settings.json'
 
     #########################################################################
     # Algorithm parameters
@@ -79,8 +89,30 @@ class Config:
 
     # Max size of the queue
     MAX_QUEUE_SIZE = 100
+    # Shared memory rows of each env for rollouts on the way to trainers, agent waits when all are in use
+    ROLLOUT_SLOTS_PER_ENV = 2
+
+    # Backpressure (0 turns each off), how often each one fired is in the telemetry
+    # Trainers drop rollouts made by a policy more than this many training steps old
+    TRAINING_MAX_POLICY_LAG = 0
+    # Trainers drop the oldest rollouts while training_q is deeper than this
+    TRAINING_Q_DROP_DEPTH = 0
+    # Agents hold on when prediction_q or training_q is deeper than the high watermark,
+    # until both are back under the low one (checking every AGENT_THROTTLE_SLEEP seconds)
+    AGENT_THROTTLE_HIGH_WATERMARK = 0
+    AGENT_THROTTLE_LOW_WATERMARK = 0
+    AGENT_THROTTLE_SLEEP = 0.001
     PREDICTION_BATCH_SIZE = 128
 
+    # Prediction batching policy
+    # greedy: take one request and whatever is already queued (no waiting)
+    # fixed: wait up to PREDICTION_MAX_WAIT_US for PREDICTION_MIN_BATCH_SIZE requests
+    # adaptive: tune min batch size and max wait online, to keep queueing delay under PREDICTION_LATENCY_SLO_US
+    PREDICTION_BATCHING = 'greedy'
+    PREDICTION_MIN_BATCH_SIZE = 8
+    PREDICTION_MAX_WAIT_US = 2000
+    PREDICTION_LATENCY_SLO_US = 5000
+
     CHANNELS = 3#input channel
     STACKED_FRAMES = 1#4
     IMAGE_WIDTH = int(config.config.GRID_SIZE.x)#30#84
@@ -134,6 +166,20 @@ class Config:
 
     # Results filename
     RESULTS_FILENAME = 'results.txt'
+    # Timeline tracing (agent env step, prediction wait, predictor batch, trainer update, model save),
+    # each process dumps its spans into TRACE_DIR when it's done, merged into TRACE_FILENAME at the end of the run
+    # (a chrome trace event file, open it in chrome://tracing or ui.perfetto.dev)
+    TRACE = False
+    TRACE_DIR = 'trace'
+    TRACE_FILENAME = 'trace.json'
+    # Max spans kept by each process
+    TRACE_MAX_EVENTS = 1000000
+    # Telemetry (queue depths, predictor batch sizes, prediction round trip latency, agent idle and trainer time),
+    # one json line every TELEMETRY_INTERVAL seconds, queue depths are sampled every TELEMETRY_QUEUE_SAMPLE_INTERVAL
+    TELEMETRY = True
+    TELEMETRY_FILENAME = 'telemetry.json'
+    TELEMETRY_INTERVAL = 10
+    TELEMETRY_QUEUE_SAMPLE_INTERVAL = 0.5
     # Network checkpoint name
     NETWORK_NAME = 'network'
 
@@ -24,26 +24,21 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import sys
-if sys.version_info >= (3,0):
-    from queue import Queue
-else:
-    from Queue import Queue
-
 import numpy as np
 import scipy.misc as misc
 
 from Config import Config
 from config import SerializerExtension
 from GameManager import GameManager
+from gym_sandbox.envs.utils.frame_stack import FrameStack
 
 
 class Environment:
     def __init__(self):
         self.game = GameManager(Config.ATARI_GAME, display=Config.PLAY_MODE)
         self.nb_frames = Config.STACKED_FRAMES
-        self.frame_q = Queue(maxsize=self.nb_frames)
-        self.previous_state = None
+        self.frame_stack = None  # built on the first frame, when frame shape is known
+        # a view of the frame stack, only valid until next step
         self.current_state = None
         self.total_reward = 0
 
@@ -61,19 +56,18 @@ class Environment:
         return image
 
     def _get_current_state(self):
-        if not self.frame_q.full():
-            return None  # frame queue is not full yet.
-        x_ = np.array(self.frame_q.queue)
-        x_ = np.transpose(x_,[1,2,0,3])
-        x_ = np.reshape(x_,[x_.shape[0], x_.shape[1],-1])
-        #x_ = np.transpose(x_, [1, 2, 0])  # move channels
-        return x_
-
-    def _update_frame_q(self, frame):
-        if self.frame_q.full():
-            self.frame_q.get()
-        image = Environment._preprocess(frame)
-        self.frame_q.put(image)
+        if not self.frame_stack.full():
+            return None  # frame stack is not full yet.
+        return self.frame_stack.state()
+
+    def _update_frame_stack(self, frame):
+        image = np.asarray(Environment._preprocess(frame))
+        if self.frame_stack is None:
+            self.frame_stack = FrameStack(image.shape, self.nb_frames)
+        self.frame_stack.push(image)
+
+    def seed(self, seed):
+        return self.game.seed(seed)
 
     def get_num_actions(self):
         return len(SerializerExtension.DIRECTS)
@@ -82,9 +76,10 @@ class Environment:
 
     def reset(self):
         self.total_reward = 0
-        self.frame_q.queue.clear()
-        self._update_frame_q(self.game.reset())
-        self.previous_state = self.current_state = None
+        if self.frame_stack is not None:
+            self.frame_stack.reset()
+        self._update_frame_stack(self.game.reset())
+        self.current_state = None
         if self.nb_frames == 1:
             self.current_state = self._get_current_state()
 
@@ -92,8 +87,7 @@ class Environment:
         observation, reward, done, _ = self.game.step(action)
 
         self.total_reward += reward
-        self._update_frame_q(observation)
+        self._update_frame_stack(observation)
 
-        self.previous_state = self.current_state
         self.current_state = self._get_current_state()
         return reward, done
@@ -24,10 +24,61 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-class Experience:
-    def __init__(self, state, action, prediction, reward, done):
-        self.state = state
-        self.action = action
-        self.prediction = prediction
-        self.reward = reward
-        self.done = done
+import numpy as np
+
+from Config import Config
+
+
+class RolloutBuffer:
+    """Preallocated rollout of one env: state, action, reward and done of each frame, written in place
+    Discounted returns of a rollout are one matrix product, batches are slices of the arrays(no copy).
+    After each rollout the last frame is moved to the front, as the first frame of the next rollout.
+    """
+    def __init__(self, capacity, state_shape, discount_factor):
+        self.capacity = capacity
+        self.states = np.zeros((capacity,) + tuple(state_shape), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.size = 0
+
+        steps = np.arange(capacity)
+        power = steps[None, :] - steps[:, None]
+        # [t, k] is discount^(k-t) for k >= t, so returns = matrix @ rewards
+        self._discount_matrix = np.where(power >= 0, discount_factor ** np.maximum(power, 0), 0).astype(np.float32)
+        self._discount_powers = (discount_factor ** steps).astype(np.float32)
+
+    def clear(self):
+        self.size = 0
+
+    def add(self, state, action):
+        """state is copied in, so it can be a view that the env overwrites on next step"""
+        self.states[self.size] = state
+        self.actions[self.size] = action
+        self.size += 1
+
+    def set_outcome(self, reward, done):
+        """reward and done of the last added frame"""
+        self.rewards[self.size - 1] = reward
+        self.dones[self.size - 1] = done
+
+    def discounted_returns(self, terminal_reward):
+        """returns of all frames but the last one, bootstrapped from terminal_reward"""
+        n = self.size - 1
+        rewards = np.clip(self.rewards[:n], Config.REWARD_MIN, Config.REWARD_MAX)
+        return self._discount_matrix[:n, :n].dot(rewards) + self._discount_powers[n - np.arange(n)] * terminal_reward
+
+    def get_batch(self, terminal_reward):
+        """(states, returns, action ids) of all frames but the last one(its reward is not known yet)
+        states and actions are views, copy them out before next add
+        """
+        n = self.size - 1
+        return self.states[:n], self.discounted_returns(terminal_reward), self.actions[:n]
+
+    def keep_last(self):
+        """keep the last frame for the next rollout"""
+        self.states[0] = self.states[self.size - 1]
+        self.actions[0] = self.actions[self.size - 1]
+        self.rewards[0] = self.rewards[self.size - 1]
+        self.dones[0] = self.dones[self.size - 1]
+        self.size = 1
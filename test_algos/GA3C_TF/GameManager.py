@@ -39,6 +39,9 @@ class GameManager:
         observation = self.env.reset()
         return observation
 
+    def seed(self, seed):
+        return self.env.seed(seed)
+
     def step(self, action):
         self._update_display()
         observation, reward, done, info = self.env.step(action)
@@ -0,0 +1,54 @@
+from multiprocessing import Semaphore
+
+import numpy as np
+import time
+
+from SharedArrays import SharedArrays
+
+
+class PredictionSlots(SharedArrays):
+    """Shared memory slot table between agents and predictors, one row per agent
+    Agent writes the states of all its envs into its own row and only sends its id through prediction_q,
+    predictor gathers the rows of a batch with one fancy index copy, writes (p, v) back into the same rows,
+    and wakes each agent up by the semaphore of its row. Nothing is pickled but the id.
+    """
+    def __init__(self, slot_num, envs_per_slot, state_shape, num_actions):
+        self.slot_num = slot_num
+        self.envs_per_slot = envs_per_slot
+        self.state_shape = tuple(state_shape)
+        self.num_actions = num_actions
+
+        # no lock, each row has only one writer at a time(agent before the request, predictor after)
+        shape = (slot_num, envs_per_slot)
+        super(PredictionSlots, self).__init__([
+            ('states', 'f', shape + self.state_shape),
+            ('p', 'f', shape + (num_actions,)),
+            ('v', 'f', shape),
+            ('request_time', 'd', (slot_num,)),  # for queueing delay
+        ])
+        self.ready = [Semaphore(0) for _ in range(slot_num)]
+
+    # ---- agent side ----
+    def put_state(self, slot, env_index, state):
+        self.states[slot, env_index] = state
+
+    def request(self, slot):
+        """all states of the slot are put, mark the time and return the slot id to send"""
+        self.request_time[slot] = time.time()
+        return slot
+
+    def wait_result(self, slot):
+        """(p, v) of each env of the slot"""
+        self.ready[slot].acquire()
+        return self.p[slot].copy(), self.v[slot].copy()
+
+    # ---- predictor side ----
+    def gather_states(self, slots, out=None):
+        """states of the slots as one batch, (slot num * envs_per_slot, state shape)"""
+        return np.take(self.states, slots, axis=0, out=out).reshape((-1,) + self.state_shape)
+
+    def put_results(self, slots, p, v):
+        self.p[slots] = p.reshape(len(slots), self.envs_per_slot, self.num_actions)
+        self.v[slots] = v.reshape(len(slots), self.envs_per_slot)
+        for _s in slots:
+            self.ready[_s].release()
@@ -25,113 +25,165 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from datetime import datetime
-from multiprocessing import Process, Queue, Value
+from multiprocessing import Process, Value
 
 import numpy as np
 import time
 
 from Config import Config
 from Environment import Environment
-from Experience import Experience
+from Experience import RolloutBuffer
+from Telemetry import queue_depth
+from Tracer import Tracer
+
+
+class EnvStream:
+    """one env of an agent, with its own rollout buffer and episode stats"""
+    def __init__(self, env, rollout):
+        self.env = env
+        self.rollout = rollout
+        self.policy_version = 0  # when the current rollout started
+        self.time_count = 0
+        self.reward_sum = 0.0
+        self.total_reward = 0
+        self.total_length = 0
+
+    def reset(self):
+        self.env.reset()
+        self.rollout.clear()
+        self.time_count = 0
+        self.reward_sum = 0.0
+        self.total_reward = 0
+        self.total_length = 0
+
+        # very first few frames
+        while self.env.current_state is None:
+            self.env.step(0)  # 0 == NOOP
 
 
 class ProcessAgent(Process):
-    def __init__(self, id, prediction_q, training_q, episode_log_q):
+    """drives Config.ENVS_PER_AGENT envs, all envs of a tick share one prediction request"""
+    def __init__(self, id, prediction_q, training_q, episode_log_q, seed_seq, prediction_slots, rollout_slots,
+                 telemetry, policy_version):
         super(ProcessAgent, self).__init__()
 
         self.id = id
         self.prediction_q = prediction_q
         self.training_q = training_q
         self.episode_log_q = episode_log_q
+        self.prediction_slots = prediction_slots
+        self.rollout_slots = rollout_slots
+        self.telemetry = telemetry
+        self.policy_version = policy_version
+        self.idle_time = 0.0  # waiting for predictions or free rollout slots/training q, in this tick
 
-        self.env = Environment()
-        self.num_actions = self.env.get_num_actions()
-        self.actions = np.arange(self.num_actions)
+        # independent streams for each env and action sampling, spawned from the server root seed
+        env_seeds = seed_seq.spawn(Config.ENVS_PER_AGENT + 1)
+        self.rng = np.random.default_rng(env_seeds.pop())
 
         self.discount_factor = Config.DISCOUNT
-        # one frame at a time
-        self.wait_q = Queue(maxsize=1)
+        self.streams = []
+        for _seed in env_seeds:
+            env = Environment()
+            # third-party gym envs only take int seeds, the SeedSequence is only for our own rng
+            env.seed(int(_seed.generate_state(1)[0]))
+            # a rollout has at most TIME_MAX + 1 frames and the last frame kept from the previous one
+            rollout = RolloutBuffer(Config.TIME_MAX + 2, prediction_slots.state_shape, self.discount_factor)
+            self.streams.append(EnvStream(env, rollout))
+        self.num_actions = self.streams[0].env.get_num_actions()
+        self.actions = np.arange(self.num_actions)
+
+        self.tracer = Tracer('agent %d' % id)
         self.exit_flag = Value('i', 0)
 
-    @staticmethod
-    def _accumulate_rewards(experiences, discount_factor, terminal_reward):
-        reward_sum = terminal_reward
-        for t in reversed(range(0, len(experiences)-1)):
-            r = np.clip(experiences[t].reward, Config.REWARD_MIN, Config.REWARD_MAX)
-            reward_sum = discount_factor * reward_sum + r
-            experiences[t].reward = reward_sum
-        return experiences[:-1]
-
-    def convert_data(self, experiences):
-        x_ = np.array([exp.state for exp in experiences])
-        a_ = np.eye(self.num_actions)[np.array([exp.action for exp in experiences])].astype(np.float32)
-        r_ = np.array([exp.reward for exp in experiences])
-        return x_, r_, a_
-
-    def predict(self, state):
-        # put the state in the prediction q
-        self.prediction_q.put((self.id, state))
-        # wait for the prediction to come back
-        p, v = self.wait_q.get()
+    def predict(self, states):
+        # write the states into our row of the shared slot table, only the id goes through the prediction q
+        for _i, _state in enumerate(states):
+            self.prediction_slots.put_state(self.id, _i, _state)
+        request_start = time.time()
+        with self.tracer.span('prediction wait'):
+            self.prediction_q.put(self.prediction_slots.request(self.id))
+            # wait for the predictions of all envs to come back
+            p, v = self.prediction_slots.wait_result(self.id)
+        round_trip = time.time() - request_start
+        self.telemetry.add_round_trip(self.id, round_trip)
+        self.idle_time += round_trip
         return p, v
 
     def select_action(self, prediction):
         if Config.PLAY_MODE:
             action = np.argmax(prediction)
         else:
-            action = np.random.choice(self.actions, p=prediction)
+            action = self.rng.choice(self.actions, p=prediction)
         return action
 
-    def run_episode(self):
-        #self.env.reset()
-        # for game that stack frames are not needed.
-        done = False
-        experiences = []
-
-        self.env.reset()
-
-
-        time_count = 0
-        reward_sum = 0.0
-
-        while not done:
-            # very first few frames
-            if self.env.current_state is None:
-                self.env.step(0)  # 0 == NOOP
-                continue
-
-            prediction, value = self.predict(self.env.current_state)
+    def send_experiences(self, env_index, stream, terminal_reward):
+        # write the rollout into shared memory, only its row goes through the training q
+        x_, r_, a_ = stream.rollout.get_batch(terminal_reward)
+        put_start = time.time()
+        row = self.rollout_slots.put(self.id * Config.ENVS_PER_AGENT + env_index, x_, r_, a_)
+        self.training_q.put((row, len(r_), stream.policy_version))
+        self.idle_time += time.time() - put_start
+        stream.policy_version = self.policy_version.value
+
+        stream.total_reward += stream.reward_sum
+        stream.total_length += len(r_) + 1  # +1 for last frame that we drop
+
+        # reset the tmax count
+        stream.time_count = 0
+        # keep the last experience for the next batch
+        stream.rollout.keep_last()
+        stream.reward_sum = 0.0
+
+    def step_envs(self):
+        """one tick of all envs, by one batched prediction"""
+        predictions, values = self.predict([_s.env.current_state for _s in self.streams])
+
+        for env_index, (stream, prediction, value) in enumerate(zip(self.streams, predictions, values)):
             action = self.select_action(prediction)
-            reward, done = self.env.step(action)
-            reward_sum += reward
-            exp = Experience(self.env.previous_state, action, prediction, reward, done)
-            experiences.append(exp)
-
-            if done or time_count == Config.TIME_MAX:
-                terminal_reward = 0 if done else value
-
-                updated_exps = ProcessAgent._accumulate_rewards(experiences, self.discount_factor, terminal_reward)
-                x_, r_, a_ = self.convert_data(updated_exps)
-                yield x_, r_, a_, reward_sum
-
-                # reset the tmax count
-                time_count = 0
-                # keep the last experience for the next batch
-                experiences = [experiences[-1]]
-                reward_sum = 0.0
-
-            time_count += 1
+            # add the state before stepping, as it's a view of the env frame stack
+            stream.rollout.add(stream.env.current_state, action)
+            with self.tracer.span('env step'):
+                reward, done = stream.env.step(action)
+            stream.reward_sum += reward
+            stream.rollout.set_outcome(reward, done)
+
+            if done or stream.time_count == Config.TIME_MAX:
+                self.send_experiences(env_index, stream, 0 if done else value)
+
+            stream.time_count += 1
+
+            if done:
+                self.episode_log_q.put((datetime.now(), stream.total_reward, stream.total_length))
+                stream.reset()
+                stream.policy_version = self.policy_version.value
+
+    def _queues_depth(self):
+        return max(queue_depth(self.prediction_q), queue_depth(self.training_q))
+
+    def throttle(self):
+        """when a queue is over AGENT_THROTTLE_HIGH_WATERMARK, hold on until both are under the low one"""
+        if self._queues_depth() <= Config.AGENT_THROTTLE_HIGH_WATERMARK:
+            return
+        throttle_start = time.time()
+        while self.exit_flag.value == 0 and self._queues_depth() > Config.AGENT_THROTTLE_LOW_WATERMARK:
+            time.sleep(Config.AGENT_THROTTLE_SLEEP)
+        throttled = time.time() - throttle_start
+        self.telemetry.add_throttle(self.id, throttled)
+        self.idle_time += throttled
 
     def run(self):
         # randomly sleep up to 1 second. helps agents boot smoothly.
-        time.sleep(np.random.rand())
-        np.random.seed(np.int32(time.time() % 1 * 1000 + self.id * 10))
+        time.sleep(self.rng.random())
 
+        for stream in self.streams:
+            stream.reset()
+            stream.policy_version = self.policy_version.value
         while self.exit_flag.value == 0:
-            total_reward = 0
-            total_length = 0
-            for x_, r_, a_, reward_sum in self.run_episode():
-                total_reward += reward_sum
-                total_length += len(r_) + 1  # +1 for last frame that we drop
-                self.training_q.put((x_, r_, a_))
-            self.episode_log_q.put((datetime.now(), total_reward, total_length))
+            tick_start = time.time()
+            self.idle_time = 0.0
+            if Config.AGENT_THROTTLE_HIGH_WATERMARK > 0:
+                self.throttle()
+            self.step_envs()
+            self.telemetry.add_agent_time(self.id, self.idle_time, time.time() - tick_start)
+        self.tracer.dump()
@@ -26,9 +26,9 @@
 
 import sys
 if sys.version_info >= (3,0):
-    from queue import Queue as queueQueue
+    from queue import Queue as queueQueue, Empty
 else:
-    from Queue import Queue as queueQueue
+    from Queue import Queue as queueQueue, Empty
 
 from datetime import datetime
 from multiprocessing import Process, Queue, Value
@@ -37,11 +37,15 @@ import numpy as np
 import time
 
 from Config import Config
+from Telemetry import Telemetry, queue_depth
+from gym_sandbox.envs.utils.logger_openai import JSONOutputFormat
 
 
 class ProcessStats(Process):
-    def __init__(self):
+    def __init__(self, prediction_q, training_q):
         super(ProcessStats, self).__init__()
+        self.prediction_q = prediction_q
+        self.training_q = training_q
         self.episode_log_q = Queue(maxsize=100)
         self.episode_count = Value('i', 0)
         self.training_count = Value('i', 0)
@@ -49,6 +53,12 @@ class ProcessStats(Process):
         self.trainer_count = Value('i', 0)
         self.predictor_count = Value('i', 0)
         self.agent_count = Value('i', 0)
+        # prediction batching, added up by predictors
+        self.predictor_batch_count = Value('l', 0)
+        self.predictor_item_count = Value('l', 0)
+        self.prediction_delay_sum = Value('d', 0)  # seconds from request to the start of its batch
+        # finer counters (batch size histogram, latency, idle and trainer time), emitted to TELEMETRY_FILENAME
+        self.telemetry = Telemetry(Config.MAX_AGENTS, Config.PREDICTION_BATCH_SIZE)
         self.total_frame_count = 0
 
     def FPS(self):
@@ -59,7 +69,70 @@ class ProcessStats(Process):
         # average TPS from the beginning of the training (not current TPS)
         return np.ceil(self.training_count.value / (time.time() - self.start_time))
 
+    def add_prediction_batch(self, size, delay_sum):
+        """size: number of requests, delay_sum: queueing delay of all requests"""
+        with self.predictor_batch_count.get_lock():
+            self.predictor_batch_count.value += 1
+            self.predictor_item_count.value += size * Config.ENVS_PER_AGENT
+            self.prediction_delay_sum.value += delay_sum * Config.ENVS_PER_AGENT
+        self.telemetry.add_prediction_batch(size)
+
+    def _prediction_batch_stats(self, last):
+        """average batch size and queueing delay(ms) since last call"""
+        with self.predictor_batch_count.get_lock():
+            cur = (self.predictor_batch_count.value, self.predictor_item_count.value,
+                   self.prediction_delay_sum.value)
+        batch_num, item_num, delay_sum = [_c - _l for _c, _l in zip(cur, last)]
+        if item_num == 0:
+            return cur, 0, 0
+        return cur, item_num / batch_num, delay_sum / item_num * 1000
+
+    def _sample_queues(self):
+        for _samples, _q in zip(self.queue_samples, (self.prediction_q, self.training_q)):
+            depth = queue_depth(_q)
+            if depth >= 0:  # -1 if the OS can't tell, skipped
+                _samples.append(depth)
+
+    def _write_telemetry(self, telemetry_logger):
+        now = time.time()
+        cur = self.telemetry.snapshot()
+        prediction_q, training_q = self.queue_samples
+        kvs = {
+            'time': int(now - self.start_time),
+            'episode': self.episode_count.value,
+            'pps': float(self.FPS()),
+            'tps': float(self.TPS()),
+            'prediction_q_mean': float(np.mean(prediction_q)) if prediction_q else 0.0,
+            'prediction_q_max': int(max(prediction_q)) if prediction_q else 0,
+            'training_q_mean': float(np.mean(training_q)) if training_q else 0.0,
+            'training_q_max': int(max(training_q)) if training_q else 0,
+        }
+        kvs.update(self.telemetry.report(self.last_telemetry, cur))
+        telemetry_logger.writekvs(kvs)
+
+        self.last_telemetry = cur
+        self.queue_samples = ([], [])
+
+    def _next_episode(self, telemetry_logger):
+        """wait for next episode, meanwhile sample queue depths and emit telemetry on time"""
+        if telemetry_logger is None:
+            return self.episode_log_q.get()
+        while True:
+            self._sample_queues()
+            if time.time() - self.last_telemetry_time >= Config.TELEMETRY_INTERVAL:
+                self._write_telemetry(telemetry_logger)
+                self.last_telemetry_time = time.time()
+            try:
+                return self.episode_log_q.get(timeout=Config.TELEMETRY_QUEUE_SAMPLE_INTERVAL)
+            except Empty:
+                pass
+
     def run(self):
+        telemetry_logger = JSONOutputFormat(open(Config.TELEMETRY_FILENAME, 'a')) if Config.TELEMETRY else None
+        self.last_telemetry = self.telemetry.snapshot()
+        self.last_telemetry_time = time.time()
+        self.queue_samples = ([], [])  # prediction q, training q depths
+
         with open(Config.RESULTS_FILENAME, 'a') as results_logger:
             rolling_frame_count = 0
             rolling_reward = 0
@@ -67,8 +140,9 @@ class ProcessStats(Process):
             
             self.start_time = time.time()
             first_time = datetime.now()
+            last_batch_stats = (0, 0, 0)
             while True:
-                episode_time, reward, length = self.episode_log_q.get()
+                episode_time, reward, length = self._next_episode(telemetry_logger)
                 results_logger.write('%s, %d, %d\n' % (episode_time.strftime("%Y-%m-%d %H:%M:%S"), reward, length))
                 results_logger.flush()
 
@@ -90,16 +164,19 @@ class ProcessStats(Process):
                     self.should_save_model.value = 1
 
                 if self.episode_count.value % Config.PRINT_STATS_FREQUENCY == 0:
+                    last_batch_stats, batch_size, batch_delay = self._prediction_batch_stats(last_batch_stats)
                     print(
                         '[Time: %8d] '
                         '[Episode: %8d Score: %8.4f] '
                         '[RScore: %8.4f RPPS: %5d] '
                         '[PPS: %4d TPS: %4d] '
-                        '[NT: %2d NP: %2d NA: %2d]'
+                        '[NT: %2d NP: %2d NA: %2d] '
+                        '[PB: %5.1f PD: %6.2fms]'
                         % (int(time.time()-self.start_time),
                            self.episode_count.value, reward,
                            rolling_reward / results_q.qsize(),
                            rolling_frame_count / (datetime.now() - first_time).total_seconds(),
                            self.FPS(), self.TPS(),
-                           self.trainer_count.value, self.predictor_count.value, self.agent_count.value))
+                           self.trainer_count.value, self.predictor_count.value, self.agent_count.value,
+                           batch_size, batch_delay))
                     sys.stdout.flush()
@@ -0,0 +1,56 @@
+from multiprocessing import Semaphore
+
+import numpy as np
+
+from SharedArrays import SharedArrays
+
+
+class RolloutSlots(SharedArrays):
+    """Shared memory rollouts from agents to trainers
+    Each env of each agent owns `depth` rows, used in turn. Agent writes a rollout(states, returns, action ids)
+    into its next row and only sends (row, length) through training_q, trainer copies it into its batch and
+    frees the row. A row is never written again before it's freed(semaphore of the row).
+    Each rollout is tagged with the policy version(training steps done) it was made by, see Server.policy_version.
+    """
+    def __init__(self, env_num, depth, capacity, state_shape, num_actions):
+        self.env_num = env_num
+        self.depth = depth
+        self.capacity = capacity  # max frames of a rollout
+        self.state_shape = tuple(state_shape)
+        self.num_actions = num_actions
+
+        row_num = env_num * depth
+        super(RolloutSlots, self).__init__([
+            ('states', 'f', (row_num, capacity) + self.state_shape),
+            ('returns', 'f', (row_num, capacity)),
+            ('actions', 'q', (row_num, capacity)),
+        ])
+        self.free = [Semaphore(1) for _ in range(row_num)]
+        self._next_row = {}  # env id -> which of its rows to use next, only used by the agent of the env
+
+    # ---- agent side ----
+    def put(self, env_id, states, returns, actions):
+        """write a rollout into the next row of the env(wait if it's not freed yet), return the row"""
+        k = self._next_row.get(env_id, 0)
+        self._next_row[env_id] = (k + 1) % self.depth
+        row = env_id * self.depth + k
+
+        self.free[row].acquire()
+        n = len(returns)
+        self.states[row, :n] = states
+        self.returns[row, :n] = returns
+        self.actions[row, :n] = actions
+        return row
+
+    # ---- trainer side ----
+    def take(self, row, length, x_out, r_out, a_out):
+        """copy a rollout into batch buffers(a_out gets one-hot actions), then free the row"""
+        np.copyto(x_out, self.states[row, :length])
+        np.copyto(r_out, self.returns[row, :length])
+        a_out.fill(0)
+        a_out[np.arange(length), self.actions[row, :length]] = 1
+        self.free[row].release()
+
+    def discard(self, row):
+        """free the row without reading it, the rollout is dropped"""
+        self.free[row].release()
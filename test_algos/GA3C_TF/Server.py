@@ -24,33 +24,56 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from multiprocessing import Queue
+from multiprocessing import Queue, Value
 
+import numpy as np
 import time
 
 from Config import Config
 from Environment import Environment
 from NetworkVP import NetworkVP
+from PredictionSlots import PredictionSlots
 from ProcessAgent import ProcessAgent
 from ProcessStats import ProcessStats
+from RolloutSlots import RolloutSlots
 from ThreadDynamicAdjustment import ThreadDynamicAdjustment
 from ThreadPredictor import ThreadPredictor
 from ThreadTrainer import ThreadTrainer
+from Tracer import Tracer, clear_traces, merge_traces
 
 
 class Server:
     def __init__(self):
-        self.stats = ProcessStats()
+        # agents throttled over the high watermark would never be released if low > high
+        assert Config.AGENT_THROTTLE_LOW_WATERMARK <= Config.AGENT_THROTTLE_HIGH_WATERMARK, \
+            'AGENT_THROTTLE_LOW_WATERMARK must not be larger than AGENT_THROTTLE_HIGH_WATERMARK'
 
         self.training_q = Queue(maxsize=Config.MAX_QUEUE_SIZE)
         self.prediction_q = Queue(maxsize=Config.MAX_QUEUE_SIZE)
-
-        self.model = NetworkVP(Config.DEVICE, Config.NETWORK_NAME, Environment().get_num_actions())
+        self.stats = ProcessStats(self.prediction_q, self.training_q)
+        # spans of the predictor/trainer threads and model saves, agents have their own
+        self.tracer = Tracer('server')
+        if self.tracer.enabled:
+            clear_traces(Config.TRACE_DIR)
+
+        self.seed_seq = np.random.SeedSequence(None if Config.SEED < 0 else Config.SEED)
+        print('Root seed: %d' % self.seed_seq.entropy)
+
+        num_actions = Environment().get_num_actions()
+        state_shape = (Config.IMAGE_HEIGHT, Config.IMAGE_WIDTH, Config.CHANNELS * Config.STACKED_FRAMES)
+        self.prediction_slots = PredictionSlots(Config.MAX_AGENTS, Config.ENVS_PER_AGENT, state_shape, num_actions)
+        # a rollout has at most TIME_MAX + 1 frames
+        self.rollout_slots = RolloutSlots(Config.MAX_AGENTS * Config.ENVS_PER_AGENT, Config.ROLLOUT_SLOTS_PER_ENV,
+                                          Config.TIME_MAX + 1, state_shape, num_actions)
+
+        self.model = NetworkVP(Config.DEVICE, Config.NETWORK_NAME, num_actions)
         if Config.LOAD_CHECKPOINT:
             self.stats.episode_count.value = self.model.load()
 
         self.training_step = 0
         self.frame_counter = 0
+        # training steps done, agents tag rollouts with it so trainers can tell how stale they are
+        self.policy_version = Value('l', 0)
 
         self.agents = []
         self.predictors = []
@@ -59,7 +82,9 @@ class Server:
 
     def add_agent(self):
         self.agents.append(
-            ProcessAgent(len(self.agents), self.prediction_q, self.training_q, self.stats.episode_log_q))
+            ProcessAgent(len(self.agents), self.prediction_q, self.training_q, self.stats.episode_log_q,
+                         self.seed_seq.spawn(1)[0], self.prediction_slots, self.rollout_slots, self.stats.telemetry,
+                         self.policy_version))
         self.agents[-1].start()
 
     def remove_agent(self):
@@ -88,16 +113,18 @@ class Server:
     def train_model(self, x_, r_, a_, trainer_id):
         self.model.train(x_, r_, a_, trainer_id)
         self.training_step += 1
+        with self.policy_version.get_lock():
+            self.policy_version.value += 1
         self.frame_counter += x_.shape[0]
 
         self.stats.training_count.value += 1
-        self.dynamic_adjustment.temporal_training_count += 1
 
         if Config.TENSORBOARD and self.stats.training_count.value % Config.TENSORBOARD_UPDATE_FREQUENCY == 0:
             self.model.log(x_, r_, a_)
 
     def save_model(self):
-        self.model.save(self.stats.episode_count.value)
+        with self.tracer.span('model save'):
+            self.model.save(self.stats.episode_count.value)
 
     def main(self):
         self.stats.start()
@@ -130,3 +157,8 @@ class Server:
             self.remove_predictor()
         while self.trainers:
             self.remove_trainer()
+
+        # agents have dumped their spans when they exit
+        if self.tracer.enabled:
+            self.tracer.dump()
+            merge_traces(Config.TRACE_DIR, Config.TRACE_FILENAME)
@@ -0,0 +1,37 @@
+from multiprocessing import RawArray
+
+import numpy as np
+
+
+# RawArray typecode -> numpy dtype, explicit sizes so both sides agree on every platform
+TYPECODE_DTYPES = {
+    'f': np.float32,
+    'd': np.float64,
+    'q': np.int64,
+}
+
+
+class SharedArrays:
+    """Numpy arrays on shared memory (RawArray, no lock), passed to agent processes
+    spec: (name, typecode, shape) of each array, it becomes an attribute of that name.
+    numpy views can't be pickled (e.g. spawn start method), only the RawArrays are, and the views are
+    built again on the other side.
+    """
+    def __init__(self, spec):
+        self._spec = [(_name, _typecode, tuple(_shape)) for _name, _typecode, _shape in spec]
+        self._buffers = [RawArray(_typecode, int(np.prod(_shape))) for _name, _typecode, _shape in self._spec]
+        self._attach()
+
+    def _attach(self):
+        for (_name, _typecode, _shape), _buffer in zip(self._spec, self._buffers):
+            setattr(self, _name, np.frombuffer(_buffer, dtype=TYPECODE_DTYPES[_typecode]).reshape(_shape))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for _name, _typecode, _shape in self._spec:
+            del state[_name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._attach()
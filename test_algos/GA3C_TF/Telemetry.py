@@ -0,0 +1,110 @@
+from bisect import bisect_left
+from multiprocessing import Lock
+
+import numpy as np
+
+from SharedArrays import SharedArrays
+
+
+def queue_depth(q):
+    try:
+        return q.qsize()
+    except NotImplementedError:  # e.g. macOS
+        return -1
+
+
+class Telemetry(SharedArrays):
+    """Shared counters of where the time goes, written by agents, predictors and trainers, read by ProcessStats
+    Every counter only grows, the reader takes a snapshot and reports the difference to the last one.
+    Agents own their row of the per-agent counters (no lock), predictors and trainers share a lock.
+    """
+    # upper edges of round trip latency buckets (seconds), 10us ~ 10s, 5 per decade, plus one overflow bucket
+    LATENCY_EDGES = list(np.logspace(-5, 1, 31))
+
+    def __init__(self, max_agents, max_batch_size):
+        self.max_agents = max_agents
+        self.max_batch_size = max_batch_size
+        super(Telemetry, self).__init__([
+            ('batch_hist', 'q', (max_batch_size + 1,)),  # predictor batches by size (in requests)
+            ('latency_hist', 'q', (max_agents, len(self.LATENCY_EDGES) + 1)),  # prediction round trips by latency
+            ('agent_time', 'd', (max_agents, 2)),  # idle seconds, running seconds
+            ('trainer_time', 'd', (2,)),  # trainer steps, trainer seconds
+            # backpressure: stale rollouts, stale frames, oldest rollouts, oldest frames(dropped),
+            # trained rollouts, policy lag sum of trained rollouts
+            ('drops', 'd', (6,)),
+            ('throttles', 'd', (max_agents, 2)),  # agent throttles, throttled seconds
+        ])
+        self.lock = Lock()
+
+    # ---- agent side ----
+    def add_round_trip(self, agent_id, latency):
+        self.latency_hist[agent_id, bisect_left(self.LATENCY_EDGES, latency)] += 1
+
+    def add_agent_time(self, agent_id, idle, total):
+        self.agent_time[agent_id] += (idle, total)
+
+    def add_throttle(self, agent_id, duration):
+        self.throttles[agent_id] += (1, duration)
+
+    # ---- predictor/trainer side ----
+    def add_prediction_batch(self, size):
+        with self.lock:
+            self.batch_hist[size] += 1
+
+    def add_trainer_step(self, duration):
+        with self.lock:
+            self.trainer_time += (1, duration)
+
+    def add_drop(self, stale, length):
+        """a rollout dropped by the policy lag limit(stale) or for a too deep training q(oldest)"""
+        with self.lock:
+            self.drops[0 if stale else 2] += 1
+            self.drops[1 if stale else 3] += length
+
+    def add_trained_rollout(self, policy_lag):
+        with self.lock:
+            self.drops[4:] += (1, policy_lag)
+
+    # ---- reader side ----
+    def snapshot(self):
+        return (self.batch_hist.copy(), self.latency_hist.copy(), self.agent_time.copy(), self.trainer_time.copy(),
+                self.drops.copy(), self.throttles.copy())
+
+    @classmethod
+    def percentiles(cls, hist, qs=(0.5, 0.9, 0.99)):
+        """latency percentiles(ms) from a histogram, as the upper edge of the bucket it falls in"""
+        cum = np.cumsum(hist)
+        if cum[-1] == 0:
+            return [0.0] * len(qs)
+        edges = cls.LATENCY_EDGES + [np.inf]
+        return [float(edges[np.searchsorted(cum, _q * cum[-1])]) * 1000 for _q in qs]
+
+    def report(self, last, cur):
+        """key values of the counters between two snapshots"""
+        batch_hist, latency_hist, agent_time, trainer_time, drops, throttles = [_c - _l for _c, _l in zip(cur, last)]
+        kvs = {}
+
+        sizes = np.nonzero(batch_hist)[0]
+        kvs['predictor_batches'] = int(batch_hist.sum())
+        kvs['predictor_batch_hist'] = {str(_s): int(batch_hist[_s]) for _s in sizes}
+
+        kvs['round_trip_ms_p50'], kvs['round_trip_ms_p90'], kvs['round_trip_ms_p99'] = \
+            self.percentiles(latency_hist.sum(axis=0))
+        kvs['agent_round_trip_ms'] = {str(_a): self.percentiles(latency_hist[_a])
+                                      for _a in np.nonzero(latency_hist.sum(axis=1))[0]}
+
+        idle, total = agent_time.sum(axis=0)
+        kvs['agent_idle_fraction'] = float(idle / total) if total > 0 else 0.0
+        kvs['agent_idle_fractions'] = {str(_a): float(agent_time[_a, 0] / agent_time[_a, 1])
+                                       for _a in np.nonzero(agent_time[:, 1])[0]}
+
+        steps, seconds = trainer_time
+        kvs['trainer_steps'] = int(steps)
+        kvs['trainer_step_ms'] = float(seconds / steps * 1000) if steps > 0 else 0.0
+
+        kvs['dropped_stale'], kvs['dropped_stale_frames'], kvs['dropped_oldest'], kvs['dropped_oldest_frames'] = \
+            [int(_d) for _d in drops[:4]]
+        kvs['policy_lag_mean'] = float(drops[5] / drops[4]) if drops[4] > 0 else 0.0
+        kvs['agent_throttles'] = int(throttles[:, 0].sum())
+        kvs['agent_throttled_s'] = float(throttles[:, 1].sum())
+        return kvs
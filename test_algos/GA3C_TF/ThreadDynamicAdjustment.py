@@ -24,15 +24,40 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import json
+import os
+import socket
 from threading import Thread
 
 import numpy as np
 import time
 
 from Config import Config
+from Telemetry import queue_depth
+
+
+def cpu_utilization():
+    """load of all cores, 0~1(can be over 1 when overloaded), None if the OS can't tell"""
+    try:
+        return os.getloadavg()[0] / os.cpu_count()
+    except (AttributeError, OSError):
+        return None
 
 
 class ThreadDynamicAdjustment(Thread):
+    """Online tuning of trainer/predictor/agent counts for max training throughput
+    Coordinate hill-climbing: try +1/-1 on one component, measure training frames per second (PPS)
+    over DYNAMIC_SETTINGS_STEP_WAIT seconds by samples of 1 second, and keep the move only if the gain is
+    larger than the 95% confidence interval of both measures, otherwise revert it.
+    Which move to try first is told by queue occupancy(full prediction_q: more predictors, full training_q:
+    more trainers, both empty: more agents) and cpu load(saturated cpu: try fewer agents first).
+    When no move helps, it's converged, all moves are tried again after a while.
+    The best config of each setup (host, game, envs per agent) is saved into DYNAMIC_SETTINGS_FILE and used as
+    start values next time. The saved pps is only informative, each run saves its own start config and
+    every config better than it, so a stale pps never blocks updates.
+    """
+    COMPONENTS = ('trainer_count', 'predictor_count', 'agent_count')
+
     def __init__(self, server):
         super(ThreadDynamicAdjustment, self).__init__()
         self.setDaemon(True)
@@ -42,11 +67,36 @@ class ThreadDynamicAdjustment(Thread):
 
         self.trainer_count = Config.TRAINERS
         self.predictor_count = Config.PREDICTORS
-        self.agent_count = Config.AGENTS
+        self.agent_count = min(Config.AGENTS, Config.MAX_AGENTS)
+
+        self.setup_key = '%s/%s/envs_per_agent=%d' % (socket.gethostname(), Config.ATARI_GAME, Config.ENVS_PER_AGENT)
+        self.best_pps = 0  # best of this run
+        if self.enabled:
+            self.load_best_config()
 
-        self.temporal_training_count = 0
         self.exit_flag = False
 
+    def load_best_config(self):
+        best = self._read_settings_file().get(self.setup_key)
+        if best:
+            self.trainer_count, self.predictor_count = best['trainer_count'], best['predictor_count']
+            self.agent_count = min(best['agent_count'], Config.MAX_AGENTS)
+            print('Dynamic settings: start from best config of %s %s' % (self.setup_key, best))
+
+    def save_best_config(self, pps):
+        settings = self._read_settings_file()
+        settings[self.setup_key] = dict(trainer_count=self.trainer_count, predictor_count=self.predictor_count,
+                                   agent_count=self.agent_count, pps=pps)
+        with open(Config.DYNAMIC_SETTINGS_FILE, 'w') as f:
+            json.dump(settings, f, indent=2)
+
+    @staticmethod
+    def _read_settings_file():
+        if not os.path.exists(Config.DYNAMIC_SETTINGS_FILE):
+            return {}
+        with open(Config.DYNAMIC_SETTINGS_FILE) as f:
+            return json.load(f)
+
     def enable_disable_components(self):
         cur_len = len(self.server.trainers)
         if cur_len < self.trainer_count:
@@ -72,13 +122,48 @@ class ThreadDynamicAdjustment(Thread):
             for _ in np.arange(self.agent_count, cur_len):
                 self.server.remove_agent()
 
-    def random_walk(self):
-        # 3 directions, 1 for Trainers, 1 for Predictors and 1 for Agents
-        # 3 outcome for each, -1: remove one, 0: no change, 2: remove one
-        direction = np.random.randint(3, size=3) - 1
-        self.trainer_count = max(1, self.trainer_count - direction[0])
-        self.predictor_count = max(1, self.predictor_count - direction[1])
-        self.agent_count = max(1, self.agent_count - direction[2])
+    def measure(self):
+        """training PPS of each second in a step, and the mean queue occupancy
+        return (mean pps, 95% confidence interval of it, prediction_q occupancy, training_q occupancy)
+        """
+        pps, prediction_occupancy, training_occupancy = [], [], []
+        last_frame_count, last_time = self.server.frame_counter, time.time()
+        for _ in range(Config.DYNAMIC_SETTINGS_STEP_WAIT):
+            time.sleep(1)
+            frame_count, now = self.server.frame_counter, time.time()
+            pps.append((frame_count - last_frame_count) / (now - last_time))
+            last_frame_count, last_time = frame_count, now
+            # -1 if the OS can't tell, seen as empty
+            prediction_occupancy.append(max(queue_depth(self.server.prediction_q), 0) / Config.MAX_QUEUE_SIZE)
+            training_occupancy.append(max(queue_depth(self.server.training_q), 0) / Config.MAX_QUEUE_SIZE)
+            if self.exit_flag:
+                break
+
+        ci = 1.96 * np.std(pps) / np.sqrt(len(pps))
+        return np.mean(pps), ci, np.mean(prediction_occupancy), np.mean(training_occupancy)
+
+    def propose_moves(self, prediction_occupancy, training_occupancy):
+        """all (component, +1/-1) moves, the most promising first"""
+        moves = []
+        if prediction_occupancy > 0.5:
+            moves.append(('predictor_count', 1))
+        if training_occupancy > 0.5:
+            moves.append(('trainer_count', 1))
+        cpu = cpu_utilization()
+        if cpu is not None and cpu > 0.9:
+            moves.append(('agent_count', -1))
+        elif prediction_occupancy < 0.1 and training_occupancy < 0.1:
+            moves.append(('agent_count', 1))
+
+        for _component in self.COMPONENTS:
+            for _delta in (1, -1):
+                if (_component, _delta) not in moves:
+                    moves.append((_component, _delta))
+        return [_m for _m in moves if self._is_valid_move(*_m)]
+
+    def _is_valid_move(self, component, delta):
+        new_count = getattr(self, component) + delta
+        return new_count >= 1 and (component != 'agent_count' or new_count <= Config.MAX_AGENTS)
 
     def update_stats(self):
         self.server.stats.trainer_count.value = self.trainer_count
@@ -95,27 +180,37 @@ class ThreadDynamicAdjustment(Thread):
         # Wait for initialization
         time.sleep(Config.DYNAMIC_SETTINGS_INITIAL_WAIT)
 
+        pps, ci, prediction_occupancy, training_occupancy = self.measure()
+        self.best_pps = pps
+        self.save_best_config(pps)  # the start config is always recorded
+        tried_moves = set()  # moves which didn't help since last accepted move
         while not self.exit_flag:
-            old_trainer_count, old_predictor_count, old_agent_count = \
-                self.trainer_count, self.predictor_count, self.agent_count
-            self.random_walk()
-
-            # If no change, do nothing
-            if self.trainer_count == old_trainer_count \
-                    and self.predictor_count == old_predictor_count \
-                    and self.agent_count == old_agent_count:
+            moves = [_m for _m in self.propose_moves(prediction_occupancy, training_occupancy)
+                     if _m not in tried_moves]
+            if not moves:
+                # converged, all moves are worse, look again later(load may change)
+                time.sleep(Config.DYNAMIC_SETTINGS_STEP_WAIT * 5)
+                tried_moves.clear()
+                pps, ci, prediction_occupancy, training_occupancy = self.measure()
                 continue
 
-            old_count = self.temporal_training_count
+            component, delta = moves[0]
+            setattr(self, component, getattr(self, component) + delta)
             self.enable_disable_components()
-
-            self.temporal_training_count = 0
-            time.sleep(Config.DYNAMIC_SETTINGS_STEP_WAIT)
-
-            cur_count = self.temporal_training_count
-            # if it didn't work, revert the changes
-            if cur_count < old_count:
-                self.trainer_count, self.predictor_count, self.agent_count = \
-                    old_trainer_count, old_predictor_count, old_agent_count
-
             self.update_stats()
+
+            new_pps, new_ci, new_prediction_occupancy, new_training_occupancy = self.measure()
+            if new_pps - pps > np.sqrt(ci ** 2 + new_ci ** 2):
+                # significantly better, keep it and look around from here
+                pps, ci = new_pps, new_ci
+                prediction_occupancy, training_occupancy = new_prediction_occupancy, new_training_occupancy
+                tried_moves.clear()
+                if pps > self.best_pps:
+                    self.best_pps = pps
+                    self.save_best_config(pps)
+            else:
+                # if it didn't work, revert the changes
+                setattr(self, component, getattr(self, component) - delta)
+                self.enable_disable_components()
+                self.update_stats()
+                tried_moves.add((component, delta))
@@ -24,39 +24,118 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import sys
+if sys.version_info >= (3,0):
+    from queue import Empty
+else:
+    from Queue import Empty
+
 from threading import Thread
 
 import numpy as np
+import time
 
 from Config import Config
 
 
+class BatchingPolicy:
+    """When a predictor stops collecting requests and runs the batch:
+    wait until min_batch_size requests or max_wait seconds after the first one, then also take what is already queued.
+    greedy never waits, fixed uses the config values, adaptive tunes both after each batch (AIMD)
+    so that latency (request -> result) stays under the SLO:
+        latency over SLO: halve both, batches go out sooner
+        latency under half of SLO: batch size +1 if the batch was filled, and wait longer,
+                                   up to what the SLO leaves after inference
+    """
+    def __init__(self, mode, min_batch_size, max_wait_us, latency_slo_us):
+        assert mode in ('greedy', 'fixed', 'adaptive')
+        self.mode = mode
+        self.latency_slo = latency_slo_us / 1e6
+        self.min_batch_size = 1 if mode == 'greedy' else min(min_batch_size, Config.PREDICTION_BATCH_SIZE)
+        self.max_wait = 0 if mode == 'greedy' else max_wait_us / 1e6
+        self.inference_time = None  # moving average
+
+    def update(self, size, max_latency, inference_time):
+        if self.mode != 'adaptive':
+            return
+
+        self.inference_time = inference_time if self.inference_time is None \
+            else 0.9 * self.inference_time + 0.1 * inference_time
+        wait_budget = max(0, self.latency_slo - self.inference_time)
+
+        if max_latency > self.latency_slo:
+            self.min_batch_size = max(1, self.min_batch_size // 2)
+            self.max_wait /= 2
+        elif max_latency < self.latency_slo / 2:
+            if size >= self.min_batch_size:
+                self.min_batch_size = min(Config.PREDICTION_BATCH_SIZE, self.min_batch_size + 1)
+            self.max_wait = min(wait_budget, self.max_wait + 0.1 * wait_budget)
+
+
 class ThreadPredictor(Thread):
+    EXIT_CHECK_INTERVAL = 0.1  # seconds, how long an idle predictor waits on prediction_q before checking exit_flag
+
     def __init__(self, server, id):
-        super(ThreadPredictor, self).__init__()
+        super(ThreadPredictor, self).__init__(name='predictor %d' % id)
         self.setDaemon(True)
 
         self.id = id
         self.server = server
         self.exit_flag = False
+        self.batching_policy = BatchingPolicy(Config.PREDICTION_BATCHING, Config.PREDICTION_MIN_BATCH_SIZE,
+                                              Config.PREDICTION_MAX_WAIT_US, Config.PREDICTION_LATENCY_SLO_US)
+
+    def _collect_batch(self, ids):
+        """fill ids with waiting requests by the batching policy, return batch size(0 when exiting)"""
+        prediction_q = self.server.prediction_q
+        while True:
+            try:
+                ids[0] = prediction_q.get(timeout=self.EXIT_CHECK_INTERVAL)
+                break
+            except Empty:
+                if self.exit_flag:
+                    return 0
+        deadline = time.time() + self.batching_policy.max_wait
+
+        size = 1
+        while size < Config.PREDICTION_BATCH_SIZE:
+            if size < self.batching_policy.min_batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    ids[size] = prediction_q.get(timeout=timeout)
+                except Empty:
+                    break
+            elif prediction_q.empty():
+                break
+            else:
+                ids[size] = prediction_q.get()
+            size += 1
+        return size
 
     def run(self):
         ids = np.zeros(Config.PREDICTION_BATCH_SIZE, dtype=np.uint16)
+        # each request has states of all envs of an agent
         states = np.zeros(
-            (Config.PREDICTION_BATCH_SIZE, Config.IMAGE_HEIGHT, Config.IMAGE_WIDTH, Config.CHANNELS*Config.STACKED_FRAMES),
+            (Config.PREDICTION_BATCH_SIZE, Config.ENVS_PER_AGENT, Config.IMAGE_HEIGHT, Config.IMAGE_WIDTH, Config.CHANNELS*Config.STACKED_FRAMES),
             dtype=np.float32)
+        slots = self.server.prediction_slots
 
         while not self.exit_flag:
-            ids[0], states[0] = self.server.prediction_q.get()
+            size = self._collect_batch(ids)
+            if size == 0:
+                break
 
-            size = 1
-            while size < Config.PREDICTION_BATCH_SIZE and not self.server.prediction_q.empty():
-                ids[size], states[size] = self.server.prediction_q.get()
-                size += 1
+            # states are already in the shared slots, gather them in one copy
+            batch_start = time.time()
+            with self.server.tracer.span('predictor batch'):
+                batch = slots.gather_states(ids[:size], out=states[:size])
+                request_time = slots.request_time[ids[:size]]  # read before results go out, rows are reused after
+                p, v = self.server.model.predict_p_and_v(batch)
 
-            batch = states[:size]
-            p, v = self.server.model.predict_p_and_v(batch)
+                slots.put_results(ids[:size], p, v)
 
-            for i in range(size):
-                if ids[i] < len(self.server.agents):
-                    self.server.agents[ids[i]].wait_q.put((p[i], v[i]))
+            batch_end = time.time()
+            self.batching_policy.update(size, batch_end - request_time.min(), batch_end - batch_start)
+            self.server.stats.add_prediction_batch(size, np.sum(batch_start - request_time))
@@ -24,33 +24,73 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import sys
+if sys.version_info >= (3,0):
+    from queue import Empty
+else:
+    from Queue import Empty
+
 from threading import Thread
 import numpy as np
+import time
 
 from Config import Config
+from Telemetry import queue_depth
 
 
 class ThreadTrainer(Thread):
+    EXIT_CHECK_INTERVAL = 0.1  # seconds, how long an idle trainer waits on training_q before checking exit_flag
+
     def __init__(self, server, id):
-        super(ThreadTrainer, self).__init__()
+        super(ThreadTrainer, self).__init__(name='trainer %d' % id)
         self.setDaemon(True)
 
         self.id = id
         self.server = server
         self.exit_flag = False
 
+    def _admit(self, length, version):
+        """whether a rollout just taken from training_q goes into the batch, see Config backpressure"""
+        policy_lag = self.server.policy_version.value - version
+        if Config.TRAINING_MAX_POLICY_LAG > 0 and policy_lag > Config.TRAINING_MAX_POLICY_LAG:
+            self.server.stats.telemetry.add_drop(True, length)
+            return False
+        # the q is FIFO, what we just took is the oldest one
+        if Config.TRAINING_Q_DROP_DEPTH > 0 and queue_depth(self.server.training_q) > Config.TRAINING_Q_DROP_DEPTH:
+            self.server.stats.telemetry.add_drop(False, length)
+            return False
+        self.server.stats.telemetry.add_trained_rollout(policy_lag)
+        return True
+
     def run(self):
+        # batch buffers are allocated once, rollouts are copied in from shared memory
+        # a batch stops growing once it's over TRAINING_MIN_BATCH_SIZE, so it's never larger than this
+        slots = self.server.rollout_slots
+        capacity = Config.TRAINING_MIN_BATCH_SIZE + slots.capacity
+        x__ = np.zeros((capacity,) + slots.state_shape, dtype=np.float32)
+        r__ = np.zeros(capacity, dtype=np.float32)
+        a__ = np.zeros((capacity, slots.num_actions), dtype=np.float32)
+
         while not self.exit_flag:
             batch_size = 0
             while batch_size <= Config.TRAINING_MIN_BATCH_SIZE:
-                x_, r_, a_ = self.server.training_q.get()
-                if batch_size == 0:
-                    x__ = x_; r__ = r_; a__ = a_
-                else:
-                    x__ = np.concatenate((x__, x_))
-                    r__ = np.concatenate((r__, r_))
-                    a__ = np.concatenate((a__, a_))
-                batch_size += x_.shape[0]
-            
+                try:
+                    row, length, version = self.server.training_q.get(timeout=self.EXIT_CHECK_INTERVAL)
+                except Empty:
+                    if self.exit_flag:
+                        break  # rows already taken are freed, the partial batch is dropped
+                    continue
+                if not self._admit(length, version):
+                    slots.discard(row)
+                    continue
+                _end = batch_size + length
+                slots.take(row, length, x__[batch_size:_end], r__[batch_size:_end], a__[batch_size:_end])
+                batch_size = _end
+
+            if self.exit_flag:
+                break
             if Config.TRAIN_MODELS:
-                self.server.train_model(x__, r__, a__, self.id)
+                step_start = time.time()
+                with self.server.tracer.span('trainer update'):
+                    self.server.train_model(x__[:batch_size], r__[:batch_size], a__[:batch_size], self.id)
+                self.server.stats.telemetry.add_trainer_step(time.time() - step_start)
@@ -0,0 +1,93 @@
+from glob import glob
+import json
+import os
+import threading
+
+import time
+
+from Config import Config
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'start')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add(self.name, self.start, time.time())
+
+
+class NullSpan:
+    """what span() gives when tracing is off, does nothing"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    """Opt-in timeline of spans in one process(e.g. with tracer.span('env step'): ...)
+    Spans are kept in memory and dumped into Config.TRACE_DIR when the process is done, one file per process,
+    then merge_traces() joins them into one chrome trace event file (chrome://tracing, ui.perfetto.dev).
+    Timestamps are wall clock, so spans of all processes line up.
+    """
+    def __init__(self, process_name, enabled=None):
+        self.enabled = Config.TRACE if enabled is None else enabled
+        self.process_name = process_name
+        self.events = []  # (name, thread id, start, duration)
+        self.thread_names = {}
+
+    def span(self, name):
+        return Span(self, name) if self.enabled else NULL_SPAN
+
+    def add(self, name, start, end):
+        if len(self.events) >= Config.TRACE_MAX_EVENTS:
+            return
+        tid = threading.get_ident()
+        self.events.append((name, tid, start, end - start))
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+
+    def dump(self):
+        if not self.enabled:
+            return
+        pid = os.getpid()
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': self.process_name}}]
+        events += [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': _tid, 'args': {'name': _name}}
+                   for _tid, _name in self.thread_names.items()]
+        events += [{'name': _name, 'cat': 'ga3c', 'ph': 'X', 'pid': pid, 'tid': _tid,
+                    'ts': _start * 1e6, 'dur': _dur * 1e6}
+                   for _name, _tid, _start, _dur in self.events]
+
+        os.makedirs(Config.TRACE_DIR, exist_ok=True)
+        with open(os.path.join(Config.TRACE_DIR, 'trace_%d.json' % pid), 'w') as f:
+            json.dump(events, f)
+        self.events = []
+
+
+def clear_traces(trace_dir):
+    """remove the per process files of an earlier run"""
+    for _path in glob(os.path.join(trace_dir, 'trace_*.json')):
+        os.remove(_path)
+
+
+def merge_traces(trace_dir, filename):
+    events = []
+    for _path in sorted(glob(os.path.join(trace_dir, 'trace_*.json'))):
+        with open(_path) as f:
+            events += json.load(f)
+    with open(filename, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    return len(events)